@@ -1,43 +1,210 @@
-from flask import Flask, Response, request, json
+import time
+from flask import Flask, Response, g, request, json, url_for
+from enumeration.cost_class import CostClass
 from enumeration.mime_type import MimeType
 from enumeration.request_part import RequestPart
 from enumeration.status_code import StatusCode
+from exception.admission_rejected_error import AdmissionRejectedError
+from exception.contour_too_large_error import ContourTooLargeError
+from exception.dem_error import DEMError
+from exception.job_failed_error import JobFailedError
+from exception.job_not_finished_error import JobNotFinishedError
+from exception.job_not_found_error import JobNotFoundError
+from exception.job_queue_full_error import JobQueueFullError
 from exception.lattice_generation_error import LatticeGenerationError
 from exception.request_error import RequestError
-from service.request_handler import handle_closed_contour_route_request, handle_linear_route_request
+from config.settings import LOG_LEVEL, RESPONSE_CACHE_BYPASS_HEADER
+from dem.pixel_cache import pixel_cache
+from service.admission_control import admit_request
+from service.closed_contour_jobs import get_job_status, send_job_result, submit_closed_contour_job
+from service.dem_warm_up import get_warm_up_error, is_ready, warm_up_dems
+from service.gpx_response import send_gpx_body
+from service.instrumentation import register_cache_statistics, render_metrics, request_duration, requests_count
+from service.request_profiling import is_profiling_requested, profile_request
+from service.request_handler import get_offset, handle_closed_contour_route_request, handle_coordinates_request, handle_linear_route_request
+from service.response_cache import create_cache_key, response_cache
+from service.route_batch import handle_linear_route_batch_request
 import xml.etree.ElementTree as ET
 import sys
 import logging
 
 app = Flask(__name__)
 logger = logging.getLogger(__name__)
-logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+logging.basicConfig(stream=sys.stdout, level=LOG_LEVEL)
+
+CACHE_STATUS_HEADER = 'X-Cache'
+CACHE_BYPASS_VALUES = ('1', 'true', 'yes')
+UNMATCHED_ENDPOINT = 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    g.request_start_time = time.perf_counter()
+
+@app.after_request
+def count_request(response):
+    # the rule and not the path is the label, so job ids do not create new series
+    endpoint = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ENDPOINT
+
+    requests_count.increment((endpoint, str(response.status_code)))
+    request_duration.observe(time.perf_counter() - g.request_start_time, (endpoint,))
+
+    return response
+
+@app.route("/ready",  methods=['GET'])
+def get_readiness():
+    if not is_ready():
+        return send_json_response({'status': 'not ready', 'error': get_warm_up_error()}, StatusCode.SERVICE_UNAVAILABLE)
+
+    return send_json_response({'status': 'ready'}, StatusCode.OK)
+
+@app.route("/metrics",  methods=['GET'])
+def get_metrics():
+    return Response(render_metrics(get_cache_statistics()), content_type=MimeType.PROMETHEUS_TEXT)
+
+def get_cache_statistics():
+    return {'pixel': pixel_cache.get_statistics(), 'response': response_cache.get_statistics()}
+
+register_cache_statistics(get_cache_statistics)
 
 @app.route("/elevation-service/linear-route/",  methods=['POST'])
+@profile_request
 def get_elevation_linear_route():      
     received_gpx_file = request.files.get(RequestPart.GPX_FILE)
 
     try:
-        return handle_linear_route_request(received_gpx_file)
+        with admit_request(CostClass.LIGHT):
+            return send_cached_response(received_gpx_file, None,
+                                        lambda store_body: handle_linear_route_request(received_gpx_file, accepts_gzip(), store_body))
     except RequestError as request_error_message:
         return send_error_response(str(request_error_message), StatusCode.BAD_REQUEST)
+    except AdmissionRejectedError as admission_rejected_error_message:
+        return send_error_response(str(admission_rejected_error_message), StatusCode.TOO_MANY_REQUESTS)
+    except DEMError as dem_error_message:
+        return send_error_response(str(dem_error_message), StatusCode.SERVICE_UNAVAILABLE)
+
+@app.route("/elevation-service/linear-route/batch/",  methods=['POST'])
+@profile_request
+def get_elevation_linear_route_batch():
+    received_gpx_files = request.files.getlist(RequestPart.GPX_FILE)
+    received_gpx_archive = request.files.get(RequestPart.GPX_ARCHIVE)
+
+    try:
+        with admit_request(CostClass.LIGHT):
+            return handle_linear_route_batch_request(received_gpx_files, received_gpx_archive)
+    except RequestError as request_error_message:
+        return send_error_response(str(request_error_message), StatusCode.BAD_REQUEST)
+    except AdmissionRejectedError as admission_rejected_error_message:
+        return send_error_response(str(admission_rejected_error_message), StatusCode.TOO_MANY_REQUESTS)
+    except DEMError as dem_error_message:
+        return send_error_response(str(dem_error_message), StatusCode.SERVICE_UNAVAILABLE)
 
 @app.route("/elevation-service/closed-contour-route/",  methods=['POST'])
+@profile_request
 def get_elevation_closed_contour_route():
     received_gpx_file = request.files.get(RequestPart.GPX_FILE)
     received_offset = request.form.get(RequestPart.OFFSET)
 
     try:
-        return handle_closed_contour_route_request(received_gpx_file, received_offset)
+        return send_cached_response(received_gpx_file, received_offset,
+                                    lambda store_body: handle_closed_contour_route_request(received_gpx_file, received_offset, accepts_gzip(), store_body))
     except RequestError as request_error_message:
         return send_error_response(str(request_error_message), StatusCode.BAD_REQUEST)
     except LatticeGenerationError as lattice_generation_error_message:
         return send_error_response(str(lattice_generation_error_message), StatusCode.UNPROCESSABLE_ENTITY)
+    except ContourTooLargeError as contour_too_large_error_message:
+        return send_error_response(str(contour_too_large_error_message), StatusCode.PAYLOAD_TOO_LARGE)
+    except AdmissionRejectedError as admission_rejected_error_message:
+        return send_error_response(str(admission_rejected_error_message), StatusCode.TOO_MANY_REQUESTS)
+    except DEMError as dem_error_message:
+        return send_error_response(str(dem_error_message), StatusCode.SERVICE_UNAVAILABLE)
+
+@app.route("/elevation-service/coordinates/",  methods=['POST'])
+@profile_request
+def get_elevation_coordinates():
+    try:
+        with admit_request(CostClass.LIGHT):
+            return handle_coordinates_request(request.get_data(), request.mimetype)
+    except RequestError as request_error_message:
+        return send_error_response(str(request_error_message), StatusCode.BAD_REQUEST)
+    except AdmissionRejectedError as admission_rejected_error_message:
+        return send_error_response(str(admission_rejected_error_message), StatusCode.TOO_MANY_REQUESTS)
+    except DEMError as dem_error_message:
+        return send_error_response(str(dem_error_message), StatusCode.SERVICE_UNAVAILABLE)
+
+@app.route("/elevation-service/closed-contour-route/jobs/",  methods=['POST'])
+def submit_closed_contour_route_job():
+    received_gpx_file = request.files.get(RequestPart.GPX_FILE)
+    received_offset = request.form.get(RequestPart.OFFSET)
+
+    try:
+        status = submit_closed_contour_job(received_gpx_file, received_offset)
+    except RequestError as request_error_message:
+        return send_error_response(str(request_error_message), StatusCode.BAD_REQUEST)
+    except JobQueueFullError as job_queue_full_error_message:
+        return send_error_response(str(job_queue_full_error_message), StatusCode.TOO_MANY_REQUESTS)
+
+    response = send_json_response(status, StatusCode.ACCEPTED)
+    response.headers['Location'] = url_for('get_closed_contour_route_job', job_id=status['job_id'])
+
+    return response
+
+@app.route("/elevation-service/closed-contour-route/jobs/<job_id>",  methods=['GET'])
+def get_closed_contour_route_job(job_id):
+    try:
+        return send_json_response(get_job_status(job_id), StatusCode.OK)
+    except JobNotFoundError as job_not_found_error_message:
+        return send_error_response(str(job_not_found_error_message), StatusCode.NOT_FOUND)
+
+@app.route("/elevation-service/closed-contour-route/jobs/<job_id>/result",  methods=['GET'])
+def get_closed_contour_route_job_result(job_id):
+    try:
+        return send_job_result(job_id, accepts_gzip())
+    except JobNotFoundError as job_not_found_error_message:
+        return send_error_response(str(job_not_found_error_message), StatusCode.NOT_FOUND)
+    except JobNotFinishedError as job_not_finished_error_message:
+        return send_error_response(str(job_not_finished_error_message), StatusCode.CONFLICT)
+    except JobFailedError as job_failed_error:
+        return send_error_response(str(job_failed_error), job_failed_error.status_code)
+
+def send_cached_response(received_gpx_file, received_offset, handle_request):
+    # cache hits are answered without parsing the file, misses are stored once their response was sent completely
+    if received_gpx_file is None or not response_cache.is_enabled() or is_cache_bypassed():
+        return handle_request(None)
+
+    if received_offset is not None and received_offset.isdigit():
+        received_offset = get_offset(received_offset)
+
+    cache_key = create_cache_key(request.endpoint, received_gpx_file, received_offset)
+    body = response_cache.get(cache_key)
+
+    if body is not None:
+        response = send_gpx_body(body, received_gpx_file.filename, accepts_gzip())
+        response.headers[CACHE_STATUS_HEADER] = 'HIT'
+
+        return response
+
+    response = handle_request(lambda body: response_cache.put(cache_key, body))
+    response.headers[CACHE_STATUS_HEADER] = 'MISS'
+
+    return response
+
+def is_cache_bypassed():
+    # a profiled request has to do the work it is profiled for
+    return request.headers.get(RESPONSE_CACHE_BYPASS_HEADER, '').lower() in CACHE_BYPASS_VALUES or is_profiling_requested()
+
+def accepts_gzip():
+    # 'gzip' in accept_encodings ignores the quality, gzip;q=0 or *;q=0 refuse gzip
+    return request.accept_encodings.quality('gzip') > 0
 
 def send_error_response(message, status_code):
     body = {"message": message}
 
+    return send_json_response(body, status_code)
+
+def send_json_response(body, status_code):
     return Response(json.dumps(body), status_code, mimetype=MimeType.JSON)
 
 if __name__ == '__main__':
+    # development server, see gunicorn.conf.py for production
+    warm_up_dems()
     app.run(host="0.0.0.0")
\ No newline at end of file
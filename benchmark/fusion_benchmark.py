@@ -0,0 +1,60 @@
+import sys
+import time
+import numpy as np
+from enumeration.dem_data_source import DEMDataSource
+from service.approximation import MAX_DIFFERENCE, fuse_elevations
+
+POINTS_COUNT = 1_000_000
+SEED = 42
+
+def calculate_approximated_elevations_per_point(elevations, points_count):
+    srtm_30m = elevations[DEMDataSource.SRTM_30_M]
+    srtm_90m = elevations[DEMDataSource.SRTM_90_M]
+    aw_3d_30m = elevations[DEMDataSource.ALOS_WORLD_3D_30_M]
+    approximated_elevations = list()
+
+    for idx in range(points_count):
+        srtm_30m_elevation = srtm_30m[idx]
+        srtm_90m_elevation = srtm_90m[idx]
+        aw_3d_30m_elevation = aw_3d_30m[idx]
+
+        if (abs(srtm_90m_elevation-srtm_30m_elevation) > MAX_DIFFERENCE
+                or abs(srtm_90m_elevation-aw_3d_30m_elevation) > MAX_DIFFERENCE):
+            elevation = (srtm_30m_elevation+aw_3d_30m_elevation) / 2
+        else:
+            elevation = (srtm_30m_elevation+srtm_90m_elevation+aw_3d_30m_elevation) / 3
+
+        approximated_elevations.append(elevation)
+
+    return approximated_elevations
+
+def generate_elevations(points_count):
+    rng = np.random.default_rng(SEED)
+    terrain = rng.uniform(0.0, 3000.0, points_count)
+
+    return {
+        DEMDataSource.SRTM_30_M: terrain + rng.normal(0.0, 1.0, points_count),
+        DEMDataSource.SRTM_90_M: terrain + rng.normal(0.0, 2.0, points_count),
+        DEMDataSource.ALOS_WORLD_3D_30_M: terrain + rng.normal(0.0, 1.0, points_count)
+    }
+
+def run(points_count):
+    elevations = generate_elevations(points_count)
+    elevation_lists = {dem_data_source: values.tolist() for dem_data_source, values in elevations.items()}
+
+    start = time.perf_counter()
+    expected = calculate_approximated_elevations_per_point(elevation_lists, points_count)
+    per_point_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fused = fuse_elevations(elevations)
+    fused_time = time.perf_counter() - start
+
+    print("points:            %d" % points_count)
+    print("per-point loop:    %.3f s" % per_point_time)
+    print("fusion engine:     %.3f s" % fused_time)
+    print("speedup:           %.1fx" % (per_point_time / fused_time))
+    print("identical results: %s" % np.array_equal(np.asarray(expected), fused))
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else POINTS_COUNT)
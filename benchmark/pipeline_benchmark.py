@@ -0,0 +1,269 @@
+import os
+
+BENCHMARK_DIRECTORY = os.environ.get('BENCHMARK_DIRECTORY', os.path.join('benchmark', 'data'))
+# The settings are read when config.settings is first imported, so the synthetic DEMs are configured before.
+# Spawned scenario processes import this module again and get the same settings.
+os.environ['DEM_DIRECTORY'] = os.path.join(BENCHMARK_DIRECTORY, 'dem')
+os.environ['TILED_DEM_DIRECTORY'] = os.path.join(BENCHMARK_DIRECTORY, 'tiled')
+GPX_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, 'gpx')
+
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import shutil
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from werkzeug.datastructures import FileStorage
+from benchmark.synthetic_data import GPX_NAMESPACE, generate_closed_contour, generate_dem_files, generate_linear_route
+from config.settings import (DEM_BACKEND, DEM_DATA_SOURCES, DEM_DIRECTORY, ELEVATION_SERVING_MODE, LATTICE_PIPELINE_MODE,
+                                LATTICE_WORKERS, PIXEL_CACHE_SIZE_MB, TILED_DEM_DIRECTORY)
+from dem.dem_registry import get_dem_file
+from dem.fused_raster import build_fused_raster
+from dem.tiled_store import convert_dem_data_sources, get_tiled_file
+from enumeration.dem_backend import DEMBackend
+from enumeration.dem_data_source import DEMDataSource
+from enumeration.job_stage import JobStage
+from enumeration.pipeline_stage import PipelineStage
+from enumeration.serving_mode import ServingMode
+from service.gpx_response import generate_tree_chunks
+from service.instrumentation import LATTICE_STAGES, StageTimer, dem_sampling_duration, measure_stage, sampled_points, stage_duration
+from service.request_handler import add_square_lattice_points, handle_linear_route_request
+
+LINEAR_ROUTE_SIZES = [1000, 10000, 100000, 1000000]
+CONTOUR_RADII = [250, 500, 1000]
+CONTOUR_OFFSETS = [5, 15]
+STAGES = [PipelineStage.PARSE, PipelineStage.BOUNDING_BOX, PipelineStage.LATTICE, PipelineStage.CLEARING, PipelineStage.RESTORE,
+            PipelineStage.VALIDATION, PipelineStage.SAMPLING, PipelineStage.FUSION, JobStage.WRITE, PipelineStage.SERIALIZE]
+# the lattice stages of /metrics and the writing of the lattice points into the tree
+CONTOUR_STAGES = LATTICE_STAGES + [JobStage.WRITE]
+TOTAL_MEASURE = 'total'
+PEAK_MEMORY_MEASURE = 'peak_memory_mb'
+KB_PER_MB = 1024
+
+def get_scenarios():
+    scenarios = [
+        {'name': 'linear-%d' % points_count, 'gpx_file': os.path.join(GPX_DIRECTORY, 'linear_%d.gpx' % points_count),
+            'offset': None, 'generate': (generate_linear_route, points_count)}
+        for points_count in LINEAR_ROUTE_SIZES
+    ]
+    scenarios += [
+        {'name': 'contour-%dm-offset-%d' % (radius, offset), 'gpx_file': os.path.join(GPX_DIRECTORY, 'contour_%dm.gpx' % radius),
+            'offset': offset, 'generate': (generate_closed_contour, radius)}
+        for radius in CONTOUR_RADII for offset in CONTOUR_OFFSETS
+    ]
+
+    return scenarios
+
+def prepare_data(scenarios):
+    generate_dem_files(DEM_DIRECTORY)
+
+    if ELEVATION_SERVING_MODE == ServingMode.FUSED and not os.path.exists(get_dem_file(DEMDataSource.FUSED)):
+        build_fused_raster(get_dem_file(DEMDataSource.FUSED))
+
+    if DEM_BACKEND == DEMBackend.TILED:
+        dem_data_sources = [DEMDataSource.FUSED] if ELEVATION_SERVING_MODE == ServingMode.FUSED else DEM_DATA_SOURCES
+        missing_dem_data_sources = [
+            dem_data_source for dem_data_source in dem_data_sources if not os.path.exists(get_tiled_file(dem_data_source))
+        ]
+
+        if missing_dem_data_sources:
+            convert_dem_data_sources(missing_dem_data_sources)
+
+    for scenario in scenarios:
+        if not os.path.exists(scenario['gpx_file']):
+            generate, size = scenario['generate']
+            generate(scenario['gpx_file'], size)
+
+def run_scenario(gpx_file, offset):
+    # Runs in a fresh process, so the peak memory, the caches and the metrics belong to this scenario only.
+    # The request pipeline is called as the end points call it and the stage times are taken from its metrics.
+    logging.disable(logging.INFO)
+    ET.register_namespace('', GPX_NAMESPACE)
+
+    start = time.perf_counter()
+
+    if offset is None:
+        output_size = run_linear_route(gpx_file)
+    else:
+        output_size = run_closed_contour(gpx_file, offset)
+
+    total_time = time.perf_counter() - start
+    points_count = int(get_histogram_sums(sampled_points).get(None, 0))
+
+    return {
+        'points': points_count,
+        'output_size': output_size,
+        'stages': get_histogram_sums(stage_duration),
+        'sampling_times': get_histogram_sums(dem_sampling_duration),
+        TOTAL_MEASURE: total_time,
+        'throughput': points_count / total_time,
+        PEAK_MEMORY_MEASURE: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / KB_PER_MB,
+        'error': None
+    }
+
+def run_linear_route(gpx_file):
+    # large files take the streamed path of the end point, as they do in the service
+    with open(gpx_file, 'rb') as file:
+        response = handle_linear_route_request(FileStorage(file, os.path.basename(gpx_file)))
+
+        return sum(len(chunk) for chunk in response.response)
+
+def run_closed_contour(gpx_file, offset):
+    stage_timer = StageTimer(CONTOUR_STAGES)
+
+    with measure_stage(PipelineStage.PARSE):
+        tree = ET.parse(gpx_file)
+
+    add_square_lattice_points(tree.getroot(), offset, stage_timer.report_stage)
+    stage_timer.finish_stage()
+
+    return sum(len(chunk) for chunk in generate_tree_chunks(tree))
+
+def get_histogram_sums(histogram):
+    # the observed sum of each series by its first label, None for a histogram without labels
+    return {(label_values[0] if label_values else None): value_sum for label_values, (_, value_sum) in histogram.values.items()}
+
+def run_benchmark(scenarios, repeat):
+    results = dict()
+
+    for scenario in scenarios:
+        runs = list()
+
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                try:
+                    runs.append(executor.submit(run_scenario, scenario['gpx_file'], scenario['offset']).result())
+                except Exception as error:
+                    runs = [{'error': '%s: %s' % (type(error).__name__, error)}]
+
+                    break
+
+        results[scenario['name']] = merge_runs(runs)
+        print_result(scenario['name'], results[scenario['name']])
+
+    return results
+
+def merge_runs(runs):
+    # the fastest time of each stage is the least disturbed by the rest of the machine, the memory is the highest seen
+    if runs[0]['error'] is not None:
+        return runs[0]
+
+    result = dict(runs[0])
+    result['stages'] = {stage: min(run['stages'][stage] for run in runs) for stage in runs[0]['stages']}
+    result['sampling_times'] = {
+        dem_data_source: min(run['sampling_times'][dem_data_source] for run in runs) for dem_data_source in runs[0]['sampling_times']
+    }
+    result[TOTAL_MEASURE] = min(run[TOTAL_MEASURE] for run in runs)
+    result['throughput'] = result['points'] / result[TOTAL_MEASURE]
+    result[PEAK_MEMORY_MEASURE] = max(run[PEAK_MEMORY_MEASURE] for run in runs)
+
+    return result
+
+def print_header():
+    print(('%-24s %9s %9s %11s %9s' + ' %12s' * len(STAGES)) % (('scenario', 'points', 'total s', 'points/s', 'peak MB') + tuple(STAGES)))
+
+def print_result(name, result):
+    if result['error'] is not None:
+        print('%-24s %s' % (name, result['error']))
+
+        return
+
+    stage_times = tuple('%12.4f' % result['stages'][stage] if stage in result['stages'] else '%12s' % '-' for stage in STAGES)
+    print(('%-24s %9d %9.3f %11.0f %9.1f' + ' %s' * len(STAGES)) % (
+        (name, result['points'], result[TOTAL_MEASURE], result['throughput'], result[PEAK_MEMORY_MEASURE]) + stage_times))
+
+def compare_with_baseline(results, baseline_results, tolerance, min_time):
+    # A measure regressed when it grew by more than tolerance, stages faster than min_time in the baseline are too noisy to compare
+    regressions = list()
+
+    for name, result in results['scenarios'].items():
+        baseline_result = baseline_results['scenarios'].get(name)
+
+        if baseline_result is None or result['error'] is not None or baseline_result['error'] is not None:
+            continue
+
+        measures = [(stage, result['stages'].get(stage), baseline_result['stages'][stage]) for stage in baseline_result['stages']]
+        measures.append((TOTAL_MEASURE, result[TOTAL_MEASURE], baseline_result[TOTAL_MEASURE]))
+
+        for measure, value, baseline_value in measures:
+            if value is not None and baseline_value >= min_time and value > baseline_value * (1.0 + tolerance):
+                regressions.append((name, measure, baseline_value, value))
+
+        if result[PEAK_MEMORY_MEASURE] > baseline_result[PEAK_MEMORY_MEASURE] * (1.0 + tolerance):
+            regressions.append((name, PEAK_MEMORY_MEASURE, baseline_result[PEAK_MEMORY_MEASURE], result[PEAK_MEMORY_MEASURE]))
+
+    return regressions
+
+def get_settings():
+    return {
+        'dem_backend': DEM_BACKEND,
+        'elevation_serving_mode': ELEVATION_SERVING_MODE,
+        'lattice_pipeline_mode': LATTICE_PIPELINE_MODE,
+        'lattice_workers': LATTICE_WORKERS,
+        'pixel_cache_size_mb': PIXEL_CACHE_SIZE_MB,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the elevation pipeline on synthetic DEMs and GPX files.')
+    parser.add_argument('scenarios', nargs='*', help='run only the scenarios starting with these names, e.g. linear contour-500m')
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each scenario, the fastest stage times are kept')
+    parser.add_argument('--output', help='write the results to this JSON file, e.g. to save a baseline')
+    parser.add_argument('--baseline', help='compare the results with this JSON file and exit with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed growth of a measure over the baseline (0.2 is 20 %%)')
+    parser.add_argument('--min-time', type=float, default=0.01, help='stages faster than this many seconds are not compared')
+    parser.add_argument('--regenerate', action='store_true', help='generate the synthetic DEMs and GPX files again')
+
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    arguments = parse_arguments()
+    scenarios = [
+        scenario for scenario in get_scenarios()
+        if not arguments.scenarios or any(scenario['name'].startswith(name) for name in arguments.scenarios)
+    ]
+
+    if arguments.regenerate:
+        for directory in (DEM_DIRECTORY, TILED_DEM_DIRECTORY, GPX_DIRECTORY):
+            shutil.rmtree(directory, ignore_errors=True)
+
+    prepare_data(scenarios)
+    print_header()
+
+    results = {'settings': get_settings(), 'scenarios': run_benchmark(scenarios, arguments.repeat)}
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if not arguments.baseline:
+        return 0
+
+    with open(arguments.baseline) as file:
+        baseline_results = json.load(file)
+
+    if baseline_results['settings'] != results['settings']:
+        print('The baseline was measured with other settings: %s' % baseline_results['settings'])
+
+    regressions = compare_with_baseline(results, baseline_results, arguments.tolerance, arguments.min_time)
+
+    for name, measure, baseline_value, value in regressions:
+        print('Regression %s %s: %.4f -> %.4f (%+.0f %%)' % (name, measure, baseline_value, value, (value / baseline_value - 1.0) * 100.0))
+
+    if not regressions:
+        print('No regressions against %s' % arguments.baseline)
+
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
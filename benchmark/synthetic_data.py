@@ -0,0 +1,134 @@
+import logging
+import os
+import numpy as np
+from osgeo import gdal, osr
+from enumeration.dem_data_source import DEMDataSource
+from enumeration.dem_file_name import DemFileName
+
+SEED = 42
+ARC_SECOND = 1.0 / 3600.0
+METERS_PER_DEGREE = 111320.0
+# the synthetic DEMs cover MIN_LNG .. MIN_LNG + SIZE_DEGREES and MAX_LAT - SIZE_DEGREES .. MAX_LAT
+MIN_LNG = 23.0
+MAX_LAT = 42.5
+SIZE_DEGREES = 0.5
+ROUTE_MARGIN_DEGREES = 0.01
+NO_DATA_VALUE = -32768
+STRIP_HEIGHT = 512
+CREATION_OPTIONS = ['TILED=YES', 'BLOCKXSIZE=256', 'BLOCKYSIZE=256']
+# resolution, noise standard deviation in meters and share of void pixels of each source
+SYNTHETIC_DEMS = {
+    DEMDataSource.SRTM_30_M: (ARC_SECOND, 1.0, 0.001),
+    DEMDataSource.SRTM_90_M: (3 * ARC_SECOND, 3.0, 0.0),
+    DEMDataSource.ALOS_WORLD_3D_30_M: (ARC_SECOND, 1.0, 0.0)
+}
+DEM_FILE_NAMES = {
+    DEMDataSource.SRTM_30_M: DemFileName.SRTM_30_M,
+    DEMDataSource.SRTM_90_M: DemFileName.SRTM_90_M,
+    DEMDataSource.ALOS_WORLD_3D_30_M: DemFileName.ALOS_WORLD_3D_30_M
+}
+ROUTE_MIN_STEP = 5.0
+ROUTE_MAX_STEP = 15.0
+ROUTE_TURN_DEVIATION = 0.3
+CONTOUR_POINTS_COUNT = 360
+GPX_NAMESPACE = 'http://www.topografix.com/GPX/1/1'
+GPX_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<gpx xmlns="%s" version="1.1" creator="benchmark">\n<trk>\n<name>%s</name>\n<trkseg>\n'
+GPX_FOOTER = '</trkseg>\n</trk>\n</gpx>\n'
+TRACK_POINT = '<trkpt lat="%.7f" lon="%.7f"></trkpt>\n'
+WRITE_CHUNK_SIZE = 10000
+
+def generate_terrain(lngs, lats):
+    # smooth hills a few kilometers wide on top of ridges of about 13 km, between roughly 200 and 1400 meters
+    return (800.0 + 450.0 * np.sin(lngs * 40.0) * np.cos(lats * 35.0)
+            + 150.0 * np.sin(lngs * 230.0 + 1.0) * np.sin(lats * 190.0))
+
+def generate_dem_files(dem_directory):
+    os.makedirs(dem_directory, exist_ok=True)
+
+    for dem_data_source, (resolution, noise_deviation, void_share) in SYNTHETIC_DEMS.items():
+        dem_file = os.path.join(dem_directory, DEM_FILE_NAMES[dem_data_source])
+
+        if not os.path.exists(dem_file):
+            seed = (SEED, list(SYNTHETIC_DEMS).index(dem_data_source))
+            generate_dem_file(dem_file, resolution, noise_deviation, void_share, np.random.default_rng(seed))
+
+def generate_dem_file(dem_file, resolution, noise_deviation, void_share, rng):
+    logging.info("Generate synthetic DEM %s", dem_file)
+
+    size = int(round(SIZE_DEGREES / resolution))
+    spatial_reference = osr.SpatialReference()
+    spatial_reference.ImportFromEPSG(4326)
+
+    driver = gdal.GetDriverByName('GTiff')
+    dem_ds = driver.Create(dem_file, size, size, 1, gdal.GDT_Int16, CREATION_OPTIONS)
+    dem_ds.SetGeoTransform((MIN_LNG, resolution, 0.0, MAX_LAT, 0.0, -resolution))
+    dem_ds.SetProjection(spatial_reference.ExportToWkt())
+    rb = dem_ds.GetRasterBand(1)
+    rb.SetNoDataValue(NO_DATA_VALUE)
+
+    # elevations are sampled at the pixel centers
+    lngs = MIN_LNG + (np.arange(size) + 0.5) * resolution
+
+    for y_offset in range(0, size, STRIP_HEIGHT):
+        height = min(STRIP_HEIGHT, size - y_offset)
+        lats = MAX_LAT - (np.arange(y_offset, y_offset + height) + 0.5) * resolution
+        strip = generate_terrain(lngs[np.newaxis, :], lats[:, np.newaxis]) + rng.normal(0.0, noise_deviation, (height, size))
+        strip = np.round(strip).astype(np.int16)
+        strip[rng.random((height, size)) < void_share] = NO_DATA_VALUE
+
+        rb.WriteArray(strip, 0, y_offset)
+
+    dem_ds.FlushCache()
+
+    rb = None
+    dem_ds = None
+
+def generate_linear_route(gpx_file, points_count):
+    # a random walk of 5 to 15 meter steps, folded back at the edges of the DEMs
+    rng = np.random.default_rng((SEED, points_count))
+    headings = np.cumsum(rng.normal(0.0, ROUTE_TURN_DEVIATION, points_count))
+    steps = rng.uniform(ROUTE_MIN_STEP, ROUTE_MAX_STEP, points_count) / METERS_PER_DEGREE
+    center_lng, center_lat = get_center()
+    lngs = center_lng + np.cumsum(steps * np.sin(headings) / np.cos(np.radians(center_lat)))
+    lats = center_lat + np.cumsum(steps * np.cos(headings))
+
+    min_lng, max_lng, min_lat, max_lat = get_route_bounds()
+    write_gpx_file(gpx_file, fold(lngs, min_lng, max_lng), fold(lats, min_lat, max_lat))
+
+def generate_closed_contour(gpx_file, radius):
+    # a closed wavy loop of the given radius in meters around the center of the DEMs
+    rng = np.random.default_rng((SEED, radius))
+    angles = np.linspace(0.0, 2.0 * np.pi, CONTOUR_POINTS_COUNT)
+    phases = rng.uniform(0.0, 2.0 * np.pi, 2)
+    radii = radius * (1.0 + 0.08 * np.sin(3.0 * angles + phases[0]) + 0.04 * np.sin(5.0 * angles + phases[1]))
+    center_lng, center_lat = get_center()
+    lngs = center_lng + radii * np.cos(angles) / (METERS_PER_DEGREE * np.cos(np.radians(center_lat)))
+    lats = center_lat + radii * np.sin(angles) / METERS_PER_DEGREE
+
+    write_gpx_file(gpx_file, lngs, lats)
+
+def write_gpx_file(gpx_file, lngs, lats):
+    logging.info("Generate synthetic GPX %s", gpx_file)
+
+    os.makedirs(os.path.dirname(gpx_file), exist_ok=True)
+
+    with open(gpx_file, 'w') as file:
+        file.write(GPX_HEADER % (GPX_NAMESPACE, os.path.basename(gpx_file)))
+
+        for start in range(0, len(lngs), WRITE_CHUNK_SIZE):
+            end = start + WRITE_CHUNK_SIZE
+            file.write(''.join(TRACK_POINT % (lat, lng) for lng, lat in zip(lngs[start:end].tolist(), lats[start:end].tolist())))
+
+        file.write(GPX_FOOTER)
+
+def fold(values, min_value, max_value):
+    width = max_value - min_value
+
+    return min_value + width - np.abs(np.mod(values - min_value, 2.0 * width) - width)
+
+def get_center():
+    return MIN_LNG + SIZE_DEGREES / 2.0, MAX_LAT - SIZE_DEGREES / 2.0
+
+def get_route_bounds():
+    return (MIN_LNG + ROUTE_MARGIN_DEGREES, MIN_LNG + SIZE_DEGREES - ROUTE_MARGIN_DEGREES,
+            MAX_LAT - SIZE_DEGREES + ROUTE_MARGIN_DEGREES, MAX_LAT - ROUTE_MARGIN_DEGREES)
@@ -0,0 +1,67 @@
+import os
+from enumeration.dem_data_source import DEMDataSource
+
+DEM_DIRECTORY = os.environ.get('DEM_DIRECTORY', 'dem/data')
+DEM_RELOAD_CHECK_INTERVAL = float(os.environ.get('DEM_RELOAD_CHECK_INTERVAL', '5.0'))
+DEM_BACKEND = os.environ.get('DEM_BACKEND', 'gdal')
+TILED_DEM_DIRECTORY = os.environ.get('TILED_DEM_DIRECTORY', 'dem/tiled')
+TILE_SIZE = int(os.environ.get('TILE_SIZE', '256'))
+MOSAIC_DIRECTORY = os.environ.get('MOSAIC_DIRECTORY', 'dem/mosaic')
+MOSAIC_OPEN_TILES = int(os.environ.get('MOSAIC_OPEN_TILES', '64'))
+DEM_DATA_SOURCES = os.environ.get('DEM_DATA_SOURCES', ','.join(
+    [DEMDataSource.SRTM_30_M, DEMDataSource.SRTM_90_M, DEMDataSource.ALOS_WORLD_3D_30_M])).split(',')
+DEM_SAMPLING_WORKERS = int(os.environ.get('DEM_SAMPLING_WORKERS', '3'))
+DEM_SAMPLING_TIMEOUT = float(os.environ.get('DEM_SAMPLING_TIMEOUT', '30.0'))
+FUSION_WEIGHTS = {
+    dem_data_source: float(weight)
+    for dem_data_source, weight in (item.split(':') for item in os.environ.get('FUSION_WEIGHTS', '').split(',') if item)
+}
+ELEVATION_SERVING_MODE = os.environ.get('ELEVATION_SERVING_MODE', 'sources')
+GPX_STREAMING_MIN_SIZE = int(os.environ.get('GPX_STREAMING_MIN_SIZE', str(10 * 1024 * 1024)))
+GPX_STREAMING_CHUNK_SIZE = int(os.environ.get('GPX_STREAMING_CHUNK_SIZE', '10000'))
+RESPONSE_CHUNK_SIZE = int(os.environ.get('RESPONSE_CHUNK_SIZE', str(64 * 1024)))
+RESPONSE_QUEUE_SIZE = int(os.environ.get('RESPONSE_QUEUE_SIZE', '4'))
+RESPONSE_GZIP_ENABLED = os.environ.get('RESPONSE_GZIP_ENABLED', 'true').lower() == 'true'
+RESPONSE_GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', '6'))
+PIXEL_CACHE_SIZE_MB = float(os.environ.get('PIXEL_CACHE_SIZE_MB', '64'))
+PIXEL_CACHE_DISABLED_SOURCES = [item for item in os.environ.get('PIXEL_CACHE_DISABLED_SOURCES', '').split(',') if item]
+RESPONSE_CACHE_MEMORY_SIZE_MB = float(os.environ.get('RESPONSE_CACHE_MEMORY_SIZE_MB', '64'))
+RESPONSE_CACHE_DIRECTORY = os.environ.get('RESPONSE_CACHE_DIRECTORY', '')
+RESPONSE_CACHE_DISK_SIZE_MB = float(os.environ.get('RESPONSE_CACHE_DISK_SIZE_MB', '1024'))
+RESPONSE_CACHE_MAX_ENTRY_SIZE_MB = float(os.environ.get('RESPONSE_CACHE_MAX_ENTRY_SIZE_MB', '16'))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', '3600'))
+RESPONSE_CACHE_BYPASS_HEADER = os.environ.get('RESPONSE_CACHE_BYPASS_HEADER', 'X-Cache-Bypass')
+JOB_DIRECTORY = os.environ.get('JOB_DIRECTORY', 'jobs')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '16'))
+JOB_RETENTION = float(os.environ.get('JOB_RETENTION', '3600'))
+LATTICE_PIPELINE_MODE = os.environ.get('LATTICE_PIPELINE_MODE', 'sequential')
+LATTICE_WORKERS = int(os.environ.get('LATTICE_WORKERS', str(os.cpu_count() or 1)))
+LATTICE_MIN_BAND_ROWS = int(os.environ.get('LATTICE_MIN_BAND_ROWS', '64'))
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', '100'))
+BATCH_MAX_SIZE_MB = float(os.environ.get('BATCH_MAX_SIZE_MB', '64'))
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = max(1, int(os.environ.get('LOG_SAMPLE_RATE', '100')))
+METRICS_DIRECTORY = os.environ.get('METRICS_DIRECTORY', '')
+PROFILING_HEADER = os.environ.get('PROFILING_HEADER', 'X-Profile')
+PROFILING_TOKENS = [item for item in os.environ.get('PROFILING_TOKENS', '').split(',') if item]
+PROFILING_DIRECTORY = os.environ.get('PROFILING_DIRECTORY', '')
+PROFILING_TOP_FUNCTIONS = int(os.environ.get('PROFILING_TOP_FUNCTIONS', '10'))
+SERVER_BIND = os.environ.get('SERVER_BIND', '0.0.0.0:5000')
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', str(os.cpu_count() or 1)))
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', '4'))
+SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', '120'))
+SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', '60'))
+SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', '1000'))
+SERVER_MAX_REQUESTS_JITTER = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', '100'))
+ADMISSION_MAX_MEMORY_MB = float(os.environ.get('ADMISSION_MAX_MEMORY_MB', '2048'))
+ADMISSION_HEAVY_LATTICE_POINTS = int(os.environ.get('ADMISSION_HEAVY_LATTICE_POINTS', '200000'))
+ADMISSION_CONCURRENCY = {
+    cost_class: int(limit)
+    for cost_class, limit in (item.split(':') for item in os.environ.get('ADMISSION_CONCURRENCY', 'heavy:2').split(',') if item)
+}
+ADMISSION_QUEUE_SIZES = {
+    cost_class: int(size)
+    for cost_class, size in (item.split(':') for item in os.environ.get('ADMISSION_QUEUE_SIZES', 'heavy:8').split(',') if item)
+}
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '30'))
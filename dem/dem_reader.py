@@ -1,38 +1,191 @@
 import logging
-from osgeo import gdal
+import os
+import numpy as np
+from config.settings import DEM_BACKEND, DEM_DATA_SOURCES, ELEVATION_SERVING_MODE
+from dem.dem_registry import get_dem_dataset
+from dem.mosaic import get_dem_mosaic
+from dem.pixel_cache import pixel_cache
+from dem.tiled_store import get_tiled_dem
+from enumeration.dem_backend import DEMBackend
+from enumeration.dem_data_source import DEMDataSource
+from enumeration.serving_mode import ServingMode
+from service.instrumentation import log_sampled_debug
 
 PIXEL_WIDTH_IDX = 1
 PIXEL_HEIGHT_IDX = 5
 UPPER_LEFT_PIXEL_LON_IDX = 0
 UPPER_LEFT_PIXEL_LAT_IDX = 3
+# points outside of a source have no data, the fusion leaves the source out for them
+OUT_OF_RASTER_ELEVATION = np.nan
+# a window read holds at most MAX_WINDOW_PIXELS pixels (4 MB of 32 bit elevations) per source and request
+MAX_WINDOW_PIXELS = 1024 * 1024
+# blocks of striped files are cached in groups of rows of about MIN_CACHED_BLOCK_PIXELS,
+# files with blocks above MAX_CACHED_BLOCK_PIXELS (e.g. a single strip) are not cached
+MIN_CACHED_BLOCK_PIXELS = 256 * 256
+MAX_CACHED_BLOCK_PIXELS = 1024 * 1024
 
-def extract_elevations_from_dem(dem_file, track_points):
-    logging.info("Read from DEM")
+def extract_elevations_from_dem(dem_data_source, track_points):
+    logging.debug("Read from DEM")
 
-    src_ds = gdal.Open(dem_file,  gdal.GA_ReadOnly)
-    gt = src_ds.GetGeoTransform()
-    rb = src_ds.GetRasterBand(1)
+    if DEM_BACKEND == DEMBackend.MOSAIC:
+        return extract_elevations_from_mosaic(dem_data_source, track_points)
+
+    dem_dataset = get_dem(dem_data_source)
+    x_indices, y_indices = calculate_pixel_indices(dem_dataset.geo_transform, track_points.lngs, track_points.lats)
+
+    # the tiled store is gathered from its mapping directly, the page cache already keeps its hot tiles
+    if DEM_BACKEND != DEMBackend.TILED and pixel_cache.is_enabled(dem_data_source):
+        return read_cached_pixels(dem_data_source, dem_dataset, x_indices, y_indices)
+
+    return read_pixels(dem_dataset, x_indices, y_indices)
+
+def extract_elevations_from_mosaic(dem_data_source, track_points):
+    # the points of each tile are read at once, the cached pixels of a tile are kept under the name of its file
+    dem_mosaic = get_dem_mosaic(dem_data_source)
+    elevations = np.full(len(track_points), OUT_OF_RASTER_ELEVATION, dtype=np.float64)
+    covered_count = 0
+
+    for tile, group in dem_mosaic.group_by_tile(track_points.lngs, track_points.lats):
+        x_indices, y_indices = calculate_pixel_indices(tile.geo_transform, track_points.lngs[group], track_points.lats[group])
+
+        if pixel_cache.is_enabled(dem_data_source):
+            tile_cache_key = dem_data_source + ':' + os.path.basename(tile.dem_file)
+            tile_elevations = read_cached_pixels(tile_cache_key, tile, x_indices, y_indices)
+        else:
+            tile_elevations = read_pixels(tile, x_indices, y_indices)
+
+        if tile.no_data_value is not None:
+            tile_elevations[tile_elevations == tile.no_data_value] = OUT_OF_RASTER_ELEVATION
+
+        elevations[group] = tile_elevations
+        covered_count += len(group)
+
+    if covered_count < len(track_points):
+        log_sampled_debug('%s: no tile covers %d points', dem_data_source, len(track_points) - covered_count)
+
+    return elevations
+
+def get_dem(dem_data_source):
+    if DEM_BACKEND == DEMBackend.TILED:
+        return get_tiled_dem(dem_data_source)
+
+    if DEM_BACKEND == DEMBackend.MOSAIC:
+        return get_dem_mosaic(dem_data_source)
+
+    return get_dem_dataset(dem_data_source)
+
+def get_served_dem_data_sources():
+    return [DEMDataSource.FUSED] if ELEVATION_SERVING_MODE == ServingMode.FUSED else DEM_DATA_SOURCES
+
+def get_no_data_value(dem_data_source):
+    return get_dem(dem_data_source).no_data_value
+
+def calculate_pixel_indices(gt, lngs, lats):
     pixel_width = gt[PIXEL_WIDTH_IDX] # w - e (pixel width)
     pixel_height = gt[PIXEL_HEIGHT_IDX] # n - s (pixel height)
     upper_left_corner_longitude = gt[UPPER_LEFT_PIXEL_LON_IDX]
     upper_left_corner_latitude = gt[UPPER_LEFT_PIXEL_LAT_IDX]
 
-    elevations = list()
-    for point in track_points:
-        point_latitude = point.lat
-        point_longitude = point.lng
-        row_idx = int((point_longitude - upper_left_corner_longitude) / pixel_width)
-        column_idx = -int((upper_left_corner_latitude - point_latitude) / pixel_height)
+    # truncation towards zero, as int() does for a single point
+    x_indices = np.trunc((lngs - upper_left_corner_longitude) / pixel_width).astype(np.int64)
+    y_indices = -np.trunc((upper_left_corner_latitude - lats) / pixel_height).astype(np.int64)
+
+    return x_indices, y_indices
+
+def read_cached_pixels(cache_key, dem_dataset, x_indices, y_indices):
+    # the blocks the points fall into are read once and kept in the cache for the next requests
+    elevations = np.full(len(x_indices), OUT_OF_RASTER_ELEVATION, dtype=np.float64)
+    inside = get_inside_mask(dem_dataset, x_indices, y_indices)
+
+    if not inside.any():
+        return elevations
+
+    block_width, block_height = dem_dataset.block_size
+
+    if block_width * block_height > MAX_CACHED_BLOCK_PIXELS:
+        elevations[inside] = read_inside_pixels(dem_dataset, x_indices[inside], y_indices[inside])
+
+        return elevations
+
+    block_height *= max(1, MIN_CACHED_BLOCK_PIXELS // (block_width * block_height))
+    modification_time = dem_dataset.modification_time
+
+    def read_cached_block(x_offset, y_offset, width, height):
+        block = pixel_cache.get_block(cache_key, modification_time, x_offset, y_offset)
+
+        if block is None:
+            block = dem_dataset.get_raster_band().ReadAsArray(x_offset, y_offset, width, height)
+            pixel_cache.put_block(cache_key, modification_time, x_offset, y_offset, block)
+
+        return block
+
+    elevations[inside] = read_pixels_by_block(dem_dataset, (block_width, block_height), read_cached_block,
+                                                x_indices[inside], y_indices[inside])
+
+    return elevations
+
+def read_pixels(dem_dataset, x_indices, y_indices):
+    elevations = np.full(len(x_indices), OUT_OF_RASTER_ELEVATION, dtype=np.float64)
+    inside = get_inside_mask(dem_dataset, x_indices, y_indices)
+
+    if inside.any():
+        elevations[inside] = read_inside_pixels(dem_dataset, x_indices[inside], y_indices[inside])
+
+    return elevations
+
+def get_inside_mask(dem_dataset, x_indices, y_indices):
+    inside = ((x_indices >= 0) & (x_indices < dem_dataset.x_size)
+                & (y_indices >= 0) & (y_indices < dem_dataset.y_size))
+    outside_count = len(x_indices) - np.count_nonzero(inside)
+
+    if outside_count:
+        log_sampled_debug('Elevation does not exist for %d points', outside_count)
+
+    return inside
+
+def read_inside_pixels(dem_dataset, x_indices, y_indices):
+    if DEM_BACKEND == DEMBackend.TILED:
+        return dem_dataset.read_pixels(x_indices, y_indices)
+
+    x_min = int(x_indices.min())
+    y_min = int(y_indices.min())
+    width = int(x_indices.max()) - x_min + 1
+    height = int(y_indices.max()) - y_min + 1
+    rb = dem_dataset.get_raster_band()
+
+    # a window is read only when it has fewer pixels than the blocks the points fall into, sparse points read just their blocks
+    if width * height <= MAX_WINDOW_PIXELS and width * height <= get_touched_block_pixels(dem_dataset, x_indices, y_indices):
+        window = rb.ReadAsArray(x_min, y_min, width, height)
+
+        return window[y_indices - y_min, x_indices - x_min].astype(np.float64)
+
+    return read_pixels_by_block(dem_dataset, dem_dataset.block_size, rb.ReadAsArray, x_indices, y_indices)
+
+def get_touched_block_pixels(dem_dataset, x_indices, y_indices):
+    block_width, block_height = dem_dataset.block_size
+    blocks_per_row = (dem_dataset.x_size + block_width - 1) // block_width
+    block_keys = (y_indices // block_height) * blocks_per_row + x_indices // block_width
 
-        try:
-            elevation = rb.ReadAsArray(row_idx, column_idx, 1, 1)
+    return len(np.unique(block_keys)) * block_width * block_height
 
-            elevations.append(float(elevation[0][0]))
-        except:
-            logging.info('Elevation does not exsit')
+def read_pixels_by_block(dem_dataset, block_size, read_block, x_indices, y_indices):
+    block_width, block_height = block_size
+    blocks_per_row = (dem_dataset.x_size + block_width - 1) // block_width
+    block_x_indices = x_indices // block_width
+    block_y_indices = y_indices // block_height
+    block_keys = block_y_indices * blocks_per_row + block_x_indices
+    order = np.argsort(block_keys, kind='stable')
+    sorted_keys = block_keys[order]
+    group_starts = np.flatnonzero(np.diff(sorted_keys)) + 1
+    elevations = np.empty(len(x_indices), dtype=np.float64)
 
-            elevations.append(0)
+    for group in np.split(order, group_starts):
+        block_x_offset = int(block_x_indices[group[0]]) * block_width
+        block_y_offset = int(block_y_indices[group[0]]) * block_height
+        width = min(block_width, dem_dataset.x_size - block_x_offset)
+        height = min(block_height, dem_dataset.y_size - block_y_offset)
+        block = read_block(block_x_offset, block_y_offset, width, height)
 
-    src_ds = None
+        elevations[group] = block[y_indices[group] - block_y_offset, x_indices[group] - block_x_offset]
 
-    return elevations
\ No newline at end of file
+    return elevations
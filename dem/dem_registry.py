@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+import time
+from osgeo import gdal
+from config.settings import DEM_DIRECTORY, DEM_RELOAD_CHECK_INTERVAL
+from enumeration.dem_data_source import DEMDataSource
+from enumeration.dem_file_name import DemFileName
+from exception.dem_error import DEMError
+
+RASTER_BAND_IDX = 1
+DEM_FILE_NAMES = {
+    DEMDataSource.SRTM_30_M: DemFileName.SRTM_30_M,
+    DEMDataSource.SRTM_90_M: DemFileName.SRTM_90_M,
+    DEMDataSource.ALOS_WORLD_3D_30_M: DemFileName.ALOS_WORLD_3D_30_M,
+    DEMDataSource.FUSED: DemFileName.FUSED
+}
+
+dem_datasets = dict()
+dem_datasets_lock = threading.Lock()
+
+class DEMDataset:
+    def __init__(self, dem_file):
+        self.dem_file = dem_file
+        self.generation = 0
+        self.last_check_time = 0.0
+        self.lock = threading.Lock()
+        self.handles = threading.local()
+
+        self.load()
+
+    def load(self):
+        logging.info("Load DEM %s", self.dem_file)
+
+        modification_time = get_modification_time(self.dem_file)
+        src_ds = open_dem_file(self.dem_file)
+        rb = src_ds.GetRasterBand(RASTER_BAND_IDX)
+
+        self.geo_transform = src_ds.GetGeoTransform()
+        self.no_data_value = rb.GetNoDataValue()
+        self.x_size = rb.XSize
+        self.y_size = rb.YSize
+        self.block_size = rb.GetBlockSize()
+        self.data_type = gdal.GetDataTypeName(rb.DataType)
+        self.modification_time = modification_time
+        self.last_check_time = time.monotonic()
+        self.generation += 1
+
+        src_ds = None
+
+    def reload_if_modified(self, force=False):
+        now = time.monotonic()
+
+        if not force and now - self.last_check_time < DEM_RELOAD_CHECK_INTERVAL:
+            return
+
+        with self.lock:
+            self.last_check_time = now
+
+            if get_modification_time(self.dem_file) != self.modification_time:
+                self.load()
+
+    def get_raster_band(self):
+        # GDAL handles must not be shared between threads, so each worker thread opens its own
+        if getattr(self.handles, 'generation', None) != self.generation:
+            src_ds = open_dem_file(self.dem_file)
+
+            self.handles.src_ds = src_ds
+            self.handles.raster_band = src_ds.GetRasterBand(RASTER_BAND_IDX)
+            self.handles.generation = self.generation
+
+        return self.handles.raster_band
+
+def get_dem_dataset(dem_data_source):
+    dem_dataset = dem_datasets.get(dem_data_source)
+
+    if dem_dataset is None:
+        with dem_datasets_lock:
+            dem_dataset = dem_datasets.get(dem_data_source)
+
+            if dem_dataset is None:
+                dem_dataset = DEMDataset(get_dem_file(dem_data_source))
+                dem_datasets[dem_data_source] = dem_dataset
+
+    dem_dataset.reload_if_modified()
+
+    return dem_dataset
+
+def reload_dem_datasets():
+    for dem_dataset in list(dem_datasets.values()):
+        dem_dataset.reload_if_modified(force=True)
+
+def close_dem_datasets():
+    with dem_datasets_lock:
+        dem_datasets.clear()
+
+def get_dem_file(dem_data_source):
+    if dem_data_source not in DEM_FILE_NAMES:
+        raise DEMError('Unknown DEM data source ' + str(dem_data_source))
+
+    return os.path.join(DEM_DIRECTORY, DEM_FILE_NAMES[dem_data_source])
+
+def open_dem_file(dem_file):
+    src_ds = gdal.Open(dem_file, gdal.GA_ReadOnly)
+
+    if src_ds is None:
+        raise DEMError('Cannot open DEM file ' + dem_file)
+
+    return src_ds
+
+def get_modification_time(dem_file):
+    try:
+        return os.path.getmtime(dem_file)
+    except OSError:
+        raise DEMError('Cannot access DEM file ' + dem_file)
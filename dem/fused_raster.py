@@ -0,0 +1,78 @@
+import logging
+import os
+import numpy as np
+from osgeo import gdal
+from config.settings import DEM_DATA_SOURCES, FUSION_WEIGHTS
+from dem.dem_registry import RASTER_BAND_IDX, get_dem_file, open_dem_file
+from enumeration.dem_data_source import DEMDataSource
+from service.approximation import fuse_elevations
+
+GRID_DEM_DATA_SOURCE = DEMDataSource.SRTM_30_M
+RESAMPLING_ALGORITHM = 'near'
+RESAMPLED_NO_DATA_VALUE = -32768.0
+# cells which no source covers, they are read as missing and get NO_ELEVATION when they are served
+FUSED_NO_DATA_VALUE = np.nan
+BLOCK_SIZE = 256
+# the raster is fused in windows of whole output blocks, so the memory does not grow with the width of the grid
+WINDOW_SIZE = 4 * BLOCK_SIZE
+OVERVIEW_LEVELS = [2, 4, 8, 16, 32]
+OVERVIEW_RESAMPLING = 'AVERAGE'
+CREATION_OPTIONS = ['TILED=YES', 'BLOCKXSIZE=%d' % BLOCK_SIZE, 'BLOCKYSIZE=%d' % BLOCK_SIZE, 'COMPRESS=DEFLATE', 'PREDICTOR=3',
+                    'BIGTIFF=IF_SAFER']
+TEMPORARY_FILE_EXTENSION = '.tmp'
+
+def build_fused_raster(fused_file, dem_data_sources=DEM_DATA_SOURCES):
+    logging.info("Build fused raster %s", fused_file)
+
+    grid_ds = open_dem_file(get_dem_file(GRID_DEM_DATA_SOURCE))
+    gt = grid_ds.GetGeoTransform()
+    x_size = grid_ds.RasterXSize
+    y_size = grid_ds.RasterYSize
+    projection = grid_ds.GetProjection()
+    output_bounds = (gt[0], gt[3] + gt[5] * y_size, gt[0] + gt[1] * x_size, gt[3])
+    # nearest neighbour keeps the value each source would return for a point in the pixel's center
+    resampled_datasets = {
+        dem_data_source: gdal.Warp('', get_dem_file(dem_data_source), format='VRT', outputBounds=output_bounds,
+                                    width=x_size, height=y_size, dstSRS=projection, resampleAlg=RESAMPLING_ALGORITHM,
+                                    dstNodata=RESAMPLED_NO_DATA_VALUE)
+        for dem_data_source in dem_data_sources
+    }
+    no_data_values = {dem_data_source: RESAMPLED_NO_DATA_VALUE for dem_data_source in dem_data_sources}
+    temporary_file = fused_file + TEMPORARY_FILE_EXTENSION
+    driver = gdal.GetDriverByName('GTiff')
+    fused_ds = driver.Create(temporary_file, x_size, y_size, 1, gdal.GDT_Float32, CREATION_OPTIONS)
+
+    fused_ds.SetGeoTransform(gt)
+    fused_ds.SetProjection(projection)
+    fused_rb = fused_ds.GetRasterBand(RASTER_BAND_IDX)
+    fused_rb.SetNoDataValue(FUSED_NO_DATA_VALUE)
+
+    for y_offset in range(0, y_size, WINDOW_SIZE):
+        height = min(WINDOW_SIZE, y_size - y_offset)
+
+        for x_offset in range(0, x_size, WINDOW_SIZE):
+            width = min(WINDOW_SIZE, x_size - x_offset)
+            windows = {
+                dem_data_source: resampled_ds.GetRasterBand(RASTER_BAND_IDX).ReadAsArray(x_offset, y_offset, width, height)
+                for dem_data_source, resampled_ds in resampled_datasets.items()
+            }
+            fused_window = fuse_elevations({dem_data_source: window.ravel() for dem_data_source, window in windows.items()},
+                                            FUSION_WEIGHTS, no_data_values, dtype=np.float32, no_elevation=FUSED_NO_DATA_VALUE)
+
+            fused_rb.WriteArray(fused_window.reshape(height, width), x_offset, y_offset)
+
+    gdal.SetConfigOption('COMPRESS_OVERVIEW', 'DEFLATE')
+    fused_ds.BuildOverviews(OVERVIEW_RESAMPLING, OVERVIEW_LEVELS)
+    fused_ds.FlushCache()
+
+    fused_rb = None
+    fused_ds = None
+    resampled_datasets = None
+    grid_ds = None
+
+    os.replace(temporary_file, fused_file)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    build_fused_raster(get_dem_file(DEMDataSource.FUSED))
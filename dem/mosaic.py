@@ -0,0 +1,175 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config.settings import DEM_RELOAD_CHECK_INTERVAL, MOSAIC_DIRECTORY, MOSAIC_OPEN_TILES
+from dem.dem_registry import DEM_FILE_NAMES, DEMDataset, get_modification_time
+from exception.dem_error import DEMError
+
+# SW corner of the tile in the file name, e.g. N42E023.hgt, n42_e023_1arc_v3.tif or ALPSMLC30_N042E023_DSM.tif
+TILE_NAME_PATTERN = re.compile(r'([NS])(\d{1,3})_?([EW])(\d{1,3})', re.IGNORECASE)
+TILE_FILE_EXTENSIONS = ('.tif', '.tiff', '.hgt')
+# layers delivered next to the elevations of an ALOS AW3D30 tile (mask, stack count and quality)
+AUXILIARY_LAYER_SUFFIXES = ('_MSK', '_STK', '_QAI')
+LONGITUDE_TILES = 360
+
+dem_mosaics = dict()
+dem_mosaics_lock = threading.Lock()
+
+class DEMMosaic:
+    # A directory of 1°x1° tiles of one source. The tiles are indexed by the degrees of their SW corner,
+    # at most open_tiles_count of them are open at once.
+    def __init__(self, mosaic_directory, open_tiles_count=MOSAIC_OPEN_TILES):
+        self.mosaic_directory = mosaic_directory
+        self.open_tiles_count = open_tiles_count
+        self.last_check_time = 0.0
+        self.lock = threading.Lock()
+        self.open_tiles = OrderedDict()
+        # tiles have their own nodata values, the points without data are returned as NaN instead
+        self.no_data_value = None
+
+        self.load()
+
+    def load(self):
+        # the directory is indexed outside of the lock, the requests keep using the old index until the new one is swapped in
+        logging.info("Load DEM mosaic %s", self.mosaic_directory)
+
+        modification_time = get_modification_time(self.mosaic_directory)
+        tile_files = index_tile_files(self.mosaic_directory, scan_tile_entries(self.mosaic_directory))
+
+        if not tile_files:
+            raise DEMError('No DEM tiles in ' + self.mosaic_directory)
+
+        with self.lock:
+            self.tile_files = tile_files
+            self.open_tiles = OrderedDict()
+            self.modification_time = modification_time
+            self.last_check_time = time.monotonic()
+
+    def reload_if_modified(self, force=False):
+        # Only the directory is checked on the request path, it changes when tiles are added, removed or replaced by a rename.
+        # One thread does the check, the others go on with the current index.
+        now = time.monotonic()
+
+        if not force and now - self.last_check_time < DEM_RELOAD_CHECK_INTERVAL:
+            return
+
+        with self.lock:
+            if not force and now - self.last_check_time < DEM_RELOAD_CHECK_INTERVAL:
+                return
+
+            self.last_check_time = now
+
+        if get_modification_time(self.mosaic_directory) != self.modification_time:
+            self.load()
+
+    def get_tile(self, tile_key, tile_file):
+        with self.lock:
+            tile = self.open_tiles.get(tile_key)
+
+            if tile is not None:
+                self.open_tiles.move_to_end(tile_key)
+
+        if tile is None:
+            # opened outside of the lock, two threads may open the same tile and one of them is dropped
+            tile = DEMDataset(tile_file)
+
+            with self.lock:
+                self.open_tiles[tile_key] = tile
+
+                # the GDAL handles of a dropped tile are closed with it
+                while len(self.open_tiles) > self.open_tiles_count:
+                    self.open_tiles.popitem(last=False)
+
+        tile.reload_if_modified()
+
+        return tile
+
+    def group_by_tile(self, lngs, lats):
+        # yields the open tile and the indices of its points, the points which no tile covers are skipped
+        tile_files = self.tile_files
+        tile_keys = get_tile_keys(lngs, lats)
+        order = np.argsort(tile_keys, kind='stable')
+        group_starts = np.flatnonzero(np.diff(tile_keys[order])) + 1
+
+        for group in np.split(order, group_starts):
+            tile_key = int(tile_keys[group[0]])
+
+            if tile_key in tile_files:
+                yield self.get_tile(tile_key, tile_files[tile_key]), group
+
+    def get_tile_center(self):
+        lat_row, lng_column = divmod(min(self.tile_files), LONGITUDE_TILES)
+
+        return lng_column - LONGITUDE_TILES // 2 + 0.5, lat_row - 90 + 0.5
+
+def get_dem_mosaic(dem_data_source):
+    dem_mosaic = dem_mosaics.get(dem_data_source)
+
+    if dem_mosaic is None:
+        with dem_mosaics_lock:
+            dem_mosaic = dem_mosaics.get(dem_data_source)
+
+            if dem_mosaic is None:
+                dem_mosaic = DEMMosaic(get_mosaic_directory(dem_data_source))
+                dem_mosaics[dem_data_source] = dem_mosaic
+
+    dem_mosaic.reload_if_modified()
+
+    return dem_mosaic
+
+def close_dem_mosaics():
+    with dem_mosaics_lock:
+        dem_mosaics.clear()
+
+def get_mosaic_directory(dem_data_source):
+    if dem_data_source not in DEM_FILE_NAMES:
+        raise DEMError('Unknown DEM data source ' + str(dem_data_source))
+
+    return os.path.join(MOSAIC_DIRECTORY, os.path.splitext(DEM_FILE_NAMES[dem_data_source])[0])
+
+def scan_tile_entries(mosaic_directory):
+    try:
+        entries = list(os.scandir(mosaic_directory))
+    except OSError:
+        raise DEMError('Cannot access DEM mosaic ' + mosaic_directory)
+
+    return [entry for entry in entries if is_elevation_tile_file(entry.name)]
+
+def is_elevation_tile_file(file_name):
+    name, extension = os.path.splitext(file_name)
+
+    return (extension.lower() in TILE_FILE_EXTENSIONS and TILE_NAME_PATTERN.search(name) is not None
+            and not name.upper().endswith(AUXILIARY_LAYER_SUFFIXES))
+
+def index_tile_files(mosaic_directory, tile_entries):
+    # two rasters of the same tile are rejected instead of one of them being served by chance
+    tile_files = dict()
+
+    for entry in tile_entries:
+        match = TILE_NAME_PATTERN.search(entry.name)
+        lat = int(match.group(2)) * (-1 if match.group(1).upper() == 'S' else 1)
+        lng = int(match.group(4)) * (-1 if match.group(3).upper() == 'W' else 1)
+        tile_key = get_tile_key(lng, lat)
+
+        if tile_key in tile_files:
+            raise DEMError('DEM tiles %s and %s of %s cover the same tile' % (os.path.basename(tile_files[tile_key]), entry.name, mosaic_directory))
+
+        tile_files[tile_key] = entry.path
+
+    logging.debug("Indexed %d tiles in %s", len(tile_files), mosaic_directory)
+
+    return tile_files
+
+def get_tile_key(lng_degree, lat_degree):
+    return (lat_degree + 90) * LONGITUDE_TILES + lng_degree + LONGITUDE_TILES // 2
+
+def get_tile_keys(lngs, lats):
+    # the tile of a point is found directly from the degrees of its coordinates, 180° E and 90° N belong to the last tiles
+    lng_degrees = np.clip(np.floor(lngs), -180, 179).astype(np.int64)
+    lat_degrees = np.clip(np.floor(lats), -90, 89).astype(np.int64)
+
+    return get_tile_key(lng_degrees, lat_degrees)
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from config.settings import PIXEL_CACHE_DISABLED_SOURCES, PIXEL_CACHE_SIZE_MB
+
+BYTES_PER_MB = 1024 * 1024
+
+class PixelCache:
+    # Keeps whole raster blocks as NumPy arrays, so a request looks up each block it touches once and gathers its pixels
+    # with NumPy. The modification time of the file is part of the key, the blocks of a replaced file are evicted by age.
+    def __init__(self, size_mb=PIXEL_CACHE_SIZE_MB, disabled_dem_data_sources=PIXEL_CACHE_DISABLED_SOURCES):
+        self.max_size = int(size_mb * BYTES_PER_MB)
+        self.disabled_dem_data_sources = set(disabled_dem_data_sources)
+        self.blocks = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def is_enabled(self, dem_data_source):
+        return self.max_size > 0 and dem_data_source not in self.disabled_dem_data_sources
+
+    def get_block(self, cache_key, modification_time, x_offset, y_offset):
+        key = (cache_key, modification_time, x_offset, y_offset)
+
+        with self.lock:
+            block = self.blocks.get(key)
+
+            if block is None:
+                self.misses += 1
+
+                return None
+
+            self.blocks.move_to_end(key)
+            self.hits += 1
+
+            return block
+
+    def put_block(self, cache_key, modification_time, x_offset, y_offset, block):
+        key = (cache_key, modification_time, x_offset, y_offset)
+
+        if block.nbytes > self.max_size:
+            return
+
+        with self.lock:
+            previous_block = self.blocks.pop(key, None)
+
+            if previous_block is not None:
+                self.size -= previous_block.nbytes
+
+            self.blocks[key] = block
+            self.size += block.nbytes
+
+            while self.size > self.max_size:
+                _, evicted_block = self.blocks.popitem(last=False)
+                self.size -= evicted_block.nbytes
+                self.evictions += 1
+
+    def get_statistics(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.blocks),
+                'size_mb': self.size / BYTES_PER_MB
+            }
+
+    def clear(self):
+        with self.lock:
+            self.blocks.clear()
+            self.size = 0
+
+pixel_cache = PixelCache()
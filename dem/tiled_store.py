@@ -0,0 +1,164 @@
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+import numpy as np
+from config.settings import DEM_DATA_SOURCES, DEM_RELOAD_CHECK_INTERVAL, TILE_SIZE, TILED_DEM_DIRECTORY
+from dem.dem_registry import DEM_FILE_NAMES, RASTER_BAND_IDX, get_dem_file, get_modification_time, open_dem_file
+from exception.dem_error import DEMError
+
+MAGIC = b'DEMT'
+VERSION = 1
+HEADER_FORMAT = '<4sHIII6d8sdB'
+HEADER_SIZE = 4096
+TILED_FILE_EXTENSION = '.tiles'
+TEMPORARY_FILE_EXTENSION = '.tmp'
+PADDING_VALUE = 0
+
+tiled_dems = dict()
+tiled_dems_lock = threading.Lock()
+
+class TiledDEM:
+    def __init__(self, tiled_file):
+        self.tiled_file = tiled_file
+        self.last_check_time = 0.0
+        self.lock = threading.Lock()
+
+        self.load()
+
+    def load(self):
+        logging.info("Load tiled DEM %s", self.tiled_file)
+
+        modification_time = get_modification_time(self.tiled_file)
+        header = read_header(self.tiled_file)
+        tile_size = header['tile_size']
+        tiles_per_row = (header['x_size'] + tile_size - 1) // tile_size
+        tiles_per_column = (header['y_size'] + tile_size - 1) // tile_size
+
+        self.tiles = np.memmap(self.tiled_file, dtype=header['dtype'], mode='r', offset=HEADER_SIZE,
+                                shape=(tiles_per_column, tiles_per_row, tile_size, tile_size))
+        self.tile_size = tile_size
+        self.geo_transform = header['geo_transform']
+        self.no_data_value = header['no_data_value']
+        self.x_size = header['x_size']
+        self.y_size = header['y_size']
+        self.modification_time = modification_time
+        self.last_check_time = time.monotonic()
+
+    def reload_if_modified(self, force=False):
+        now = time.monotonic()
+
+        if not force and now - self.last_check_time < DEM_RELOAD_CHECK_INTERVAL:
+            return
+
+        with self.lock:
+            self.last_check_time = now
+
+            if get_modification_time(self.tiled_file) != self.modification_time:
+                self.load()
+
+    def read_pixels(self, x_indices, y_indices):
+        # The tiles are indexed in the mapping without locking, their data stays in the page cache shared by the workers.
+        # A reload replaces the mapping, the read keeps the one it started with.
+        tiles = self.tiles
+        tile_size = tiles.shape[2]
+        tile_x_indices = x_indices // tile_size
+        tile_y_indices = y_indices // tile_size
+
+        return np.asarray(tiles[tile_y_indices, tile_x_indices, y_indices - tile_y_indices * tile_size, x_indices - tile_x_indices * tile_size],
+                            dtype=np.float64)
+
+def get_tiled_dem(dem_data_source):
+    tiled_dem = tiled_dems.get(dem_data_source)
+
+    if tiled_dem is None:
+        with tiled_dems_lock:
+            tiled_dem = tiled_dems.get(dem_data_source)
+
+            if tiled_dem is None:
+                tiled_dem = TiledDEM(get_tiled_file(dem_data_source))
+                tiled_dems[dem_data_source] = tiled_dem
+
+    tiled_dem.reload_if_modified()
+
+    return tiled_dem
+
+def get_tiled_file(dem_data_source):
+    if dem_data_source not in DEM_FILE_NAMES:
+        raise DEMError('Unknown DEM data source ' + str(dem_data_source))
+
+    file_name = os.path.splitext(DEM_FILE_NAMES[dem_data_source])[0] + TILED_FILE_EXTENSION
+
+    return os.path.join(TILED_DEM_DIRECTORY, file_name)
+
+def read_header(tiled_file):
+    with open(tiled_file, 'rb') as file:
+        values = struct.unpack(HEADER_FORMAT, file.read(struct.calcsize(HEADER_FORMAT)))
+
+    magic, version, tile_size, x_size, y_size = values[:5]
+    geo_transform = values[5:11]
+    dtype, no_data_value, has_no_data_value = values[11:]
+
+    if magic != MAGIC or version != VERSION:
+        raise DEMError('Invalid tiled DEM file ' + tiled_file)
+
+    return {
+        'tile_size': tile_size,
+        'x_size': x_size,
+        'y_size': y_size,
+        'geo_transform': geo_transform,
+        'dtype': np.dtype(dtype.rstrip(b'\0').decode()),
+        'no_data_value': no_data_value if has_no_data_value else None
+    }
+
+def write_header(tiled_file, tile_size, x_size, y_size, geo_transform, dtype, no_data_value):
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, tile_size, x_size, y_size, *geo_transform,
+                            dtype.str.encode(), no_data_value or 0.0, no_data_value is not None)
+
+    with open(tiled_file, 'wb') as file:
+        file.write(header.ljust(HEADER_SIZE, b'\0'))
+
+def convert_dem_to_tiled_store(dem_file, tiled_file, tile_size=TILE_SIZE):
+    logging.info("Convert %s to %s", dem_file, tiled_file)
+
+    src_ds = open_dem_file(dem_file)
+    rb = src_ds.GetRasterBand(RASTER_BAND_IDX)
+    x_size = rb.XSize
+    y_size = rb.YSize
+    tiles_per_row = (x_size + tile_size - 1) // tile_size
+    tiles_per_column = (y_size + tile_size - 1) // tile_size
+    dtype = rb.ReadAsArray(0, 0, 1, 1).dtype
+    # served files are mapped by the workers, so the new file replaces the old one instead of overwriting it
+    temporary_file = tiled_file + TEMPORARY_FILE_EXTENSION
+
+    write_header(temporary_file, tile_size, x_size, y_size, src_ds.GetGeoTransform(), dtype, rb.GetNoDataValue())
+
+    tiles = np.memmap(temporary_file, dtype=dtype, mode='r+', offset=HEADER_SIZE,
+                        shape=(tiles_per_column, tiles_per_row, tile_size, tile_size))
+
+    for tile_y in range(tiles_per_column):
+        y_offset = tile_y * tile_size
+        height = min(tile_size, y_size - y_offset)
+        strip = np.full((tile_size, tiles_per_row * tile_size), PADDING_VALUE, dtype=dtype)
+        strip[:height, :x_size] = rb.ReadAsArray(0, y_offset, x_size, height)
+
+        tiles[tile_y] = strip.reshape(tile_size, tiles_per_row, tile_size).swapaxes(0, 1)
+
+    tiles.flush()
+    del tiles
+    src_ds = None
+
+    os.replace(temporary_file, tiled_file)
+
+def convert_dem_data_sources(dem_data_sources, tile_size=TILE_SIZE):
+    os.makedirs(TILED_DEM_DIRECTORY, exist_ok=True)
+
+    for dem_data_source in dem_data_sources:
+        convert_dem_to_tiled_store(get_dem_file(dem_data_source), get_tiled_file(dem_data_source), tile_size)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    convert_dem_data_sources(sys.argv[1:] or DEM_DATA_SOURCES)
@@ -1,4 +1,6 @@
 class Location:
+    __slots__ = ('lat', 'lng')
+
     def __init__(self, lng, lat):
         self.lat = lat
         self.lng = lng
@@ -10,4 +12,4 @@ class Location:
         return self.lng == other.lng and self.lat == other.lat
 
     def __hash__(self):
-        return hash((self.lng, self.lat))
\ No newline at end of file
+        return hash((self.lng, self.lat))
@@ -0,0 +1,36 @@
+import numpy as np
+
+class SquareLattice:
+    # Point (i, j) lies at the latitude of row i and j longitude steps of row i east of min_lng.
+    # The coordinates are calculated from the rows when needed, so bands of rows can be handled separately.
+    def __init__(self, row_lats, longitude_steps, min_lng, column_spacings):
+        self.row_lats = row_lats
+        self.longitude_steps = longitude_steps
+        self.min_lng = min_lng
+        self.column_spacings = column_spacings
+        self.inside = None
+
+    @property
+    def rows_count(self):
+        return len(self.row_lats)
+
+    @property
+    def columns_count(self):
+        return self.rows_count + 1
+
+    def get_coordinates(self, row_indices, column_indices):
+        lngs = self.min_lng + self.longitude_steps[row_indices] * np.asarray(column_indices, dtype=np.float64)
+        lats = self.row_lats[row_indices]
+
+        return lngs, lats
+
+    def get_band_coordinates(self, start_row_idx, end_row_idx):
+        # (rows, columns) arrays of the latitudes and longitudes of the rows from start_row_idx to end_row_idx
+        column_indices = np.arange(self.columns_count, dtype=np.float64)
+        lngs = self.min_lng + self.longitude_steps[start_row_idx:end_row_idx, np.newaxis] * column_indices
+        lats = np.repeat(self.row_lats[start_row_idx:end_row_idx, np.newaxis], self.columns_count, axis=1)
+
+        return lats, lngs
+
+    def get_point_coordinates(self, row_idx, column_idx):
+        return self.min_lng + float(self.longitude_steps[row_idx]) * float(column_idx), float(self.row_lats[row_idx])
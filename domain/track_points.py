@@ -0,0 +1,29 @@
+import numpy as np
+from domain.location import Location
+
+class TrackPoints:
+    __slots__ = ('lngs', 'lats', 'elevations')
+
+    def __init__(self, lngs, lats, elevations=None):
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.elevations = None if elevations is None else np.asarray(elevations, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.lngs)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return Location(float(self.lngs[key]), float(self.lats[key]))
+
+        # slices give views, masks and index arrays give copies
+        elevations = None if self.elevations is None else self.elevations[key]
+
+        return TrackPoints(self.lngs[key], self.lats[key], elevations)
+
+    def __iter__(self):
+        for lng, lat in zip(self.lngs.tolist(), self.lats.tolist()):
+            yield Location(lng, lat)
+
+    def with_elevations(self, elevations):
+        return TrackPoints(self.lngs, self.lats, elevations)
@@ -0,0 +1,3 @@
+class CostClass:
+    LIGHT = 'light'
+    HEAVY = 'heavy'
\ No newline at end of file
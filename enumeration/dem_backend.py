@@ -0,0 +1,4 @@
+class DEMBackend:
+    GDAL = 'gdal'
+    TILED = 'tiled'
+    MOSAIC = 'mosaic'
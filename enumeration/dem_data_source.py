@@ -1,4 +1,5 @@
 class DEMDataSource:
     SRTM_30_M = 'srtm30m'
     SRTM_90_M = 'srtm90m'
-    ALOS_WORLD_3D_30_M = 'aw3d30m'
\ No newline at end of file
+    ALOS_WORLD_3D_30_M = 'aw3d30m'
+    FUSED = 'fused'
\ No newline at end of file
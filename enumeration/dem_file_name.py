@@ -0,0 +1,5 @@
+class DemFileName:
+    SRTM_30_M = 'srtm_30m.tif'
+    SRTM_90_M = 'srtm_90m.tif'
+    ALOS_WORLD_3D_30_M = 'alos_world_3d_30m.tif'
+    FUSED = 'fused.tif'
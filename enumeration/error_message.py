@@ -6,4 +6,16 @@ class ErrorMessage:
     INVALID_OFFSET = 'Offset cannot contain letters or symbols'
     TRACK_POINTS_NOT_FOUND = 'Track points are not added'
     LATTICE_CANNOT_BE_GENERATED = 'Cannot generate lattice, please try again with another route or offset'
-    MIN_POINTS_REQUIRED = 'At least 3 points are required'
\ No newline at end of file
+    MIN_POINTS_REQUIRED = 'At least 3 points are required'
+    JOB_NOT_FOUND = 'Job not found'
+    JOB_NOT_FINISHED = 'Job is not finished yet'
+    JOB_QUEUE_FULL = 'Too many jobs are waiting, please try again later'
+    JOB_INTERRUPTED = 'Job was interrupted, please submit it again'
+    JOB_FAILED = 'Job failed unexpectedly'
+    INVALID_COORDINATES = 'Coordinates must be an array of [longitude, latitude] pairs'
+    INVALID_BINARY_COORDINATES = 'Binary coordinates must be pairs of little-endian float64 longitudes and latitudes'
+    UNSUPPORTED_CONTENT_TYPE = 'Content type must be application/json or application/octet-stream'
+    INVALID_ARCHIVE = 'Gpx archive must be a zip file'
+    BATCH_TOO_LARGE = 'Too many or too large files in the batch'
+    CONTOUR_TOO_LARGE = 'The contour is too large for this offset, please try again with a smaller contour or a larger offset'
+    SERVER_BUSY = 'Too many requests are running, please try again later'
\ No newline at end of file
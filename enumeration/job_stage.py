@@ -0,0 +1,8 @@
+class JobStage:
+    BOUNDING_BOX = 'bounding_box'
+    LATTICE = 'lattice'
+    CLEARING = 'clearing'
+    RESTORE = 'restore'
+    VALIDATION = 'validation'
+    SAMPLING = 'sampling'
+    WRITE = 'write'
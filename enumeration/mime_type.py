@@ -1,3 +1,6 @@
 class MimeType:
     GPX_XML = 'application/gpx+xml'
-    JSON = 'application/json'
\ No newline at end of file
+    JSON = 'application/json'
+    OCTET_STREAM = 'application/octet-stream'
+    ZIP = 'application/zip'
+    PROMETHEUS_TEXT = 'text/plain; version=0.0.4; charset=utf-8'
\ No newline at end of file
@@ -0,0 +1,3 @@
+class PipelineMode:
+    SEQUENTIAL = 'sequential'
+    PARALLEL = 'parallel'
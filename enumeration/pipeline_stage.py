@@ -0,0 +1,10 @@
+class PipelineStage:
+    PARSE = 'parse'
+    BOUNDING_BOX = 'bounding_box'
+    LATTICE = 'lattice'
+    CLEARING = 'clearing'
+    RESTORE = 'restore'
+    VALIDATION = 'validation'
+    SAMPLING = 'sampling'
+    FUSION = 'fusion'
+    SERIALIZE = 'serialize'
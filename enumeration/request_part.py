@@ -1,3 +1,4 @@
 class RequestPart:
     GPX_FILE = 'gpx_file'
-    OFFSET = 'offset'
\ No newline at end of file
+    OFFSET = 'offset'
+    GPX_ARCHIVE = 'gpx_archive'
\ No newline at end of file
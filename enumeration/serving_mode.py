@@ -0,0 +1,3 @@
+class ServingMode:
+    SOURCES = 'sources'
+    FUSED = 'fused'
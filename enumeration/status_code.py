@@ -1,3 +1,11 @@
 class StatusCode:
+    OK = 200
+    ACCEPTED = 202
     BAD_REQUEST = 400
-    UNPROCESSABLE_ENTITY = 422
\ No newline at end of file
+    NOT_FOUND = 404
+    CONFLICT = 409
+    PAYLOAD_TOO_LARGE = 413
+    UNPROCESSABLE_ENTITY = 422
+    TOO_MANY_REQUESTS = 429
+    INTERNAL_SERVER_ERROR = 500
+    SERVICE_UNAVAILABLE = 503
\ No newline at end of file
@@ -0,0 +1,2 @@
+class AdmissionRejectedError(Exception):
+    pass
\ No newline at end of file
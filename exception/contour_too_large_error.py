@@ -0,0 +1,2 @@
+class ContourTooLargeError(Exception):
+    pass
\ No newline at end of file
@@ -0,0 +1,2 @@
+class DEMError(Exception):
+    pass
@@ -0,0 +1,2 @@
+class JobNotFinishedError(Exception):
+    pass
\ No newline at end of file
@@ -0,0 +1,2 @@
+class JobNotFoundError(Exception):
+    pass
\ No newline at end of file
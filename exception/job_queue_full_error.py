@@ -0,0 +1,2 @@
+class JobQueueFullError(Exception):
+    pass
\ No newline at end of file
@@ -1,28 +1,24 @@
 import logging
-from domain.location import Location
+import numpy as np
+from domain.track_points import TrackPoints
 from enumeration.gpx_element import GPXElement
 
 LATITUDE_ATTRIBUTE = 'lat'
 LONGITUDE_ATTRIBUTE = 'lon'
 
 def extract_track_points(root):
-    logging.info("Track point extraction")
+    logging.debug("Track point extraction")
 
     track_point_elements = root.findall(GPXElement.TRACK_POINT)
-    track_points = list()
+    lats = np.fromiter((float(element.attrib[LATITUDE_ATTRIBUTE]) for element in track_point_elements),
+                        dtype=np.float64, count=len(track_point_elements))
+    lngs = np.fromiter((float(element.attrib[LONGITUDE_ATTRIBUTE]) for element in track_point_elements),
+                        dtype=np.float64, count=len(track_point_elements))
 
-    for element in track_point_elements:
-        attributes = element.attrib
-        lat = float(attributes[LATITUDE_ATTRIBUTE])
-        lng = float(attributes[LONGITUDE_ATTRIBUTE])               
-        track_point = Location(lng, lat)
-
-        track_points.append(track_point)
-       
-    return track_points
+    return TrackPoints(lngs, lats)
 
 def extract_elevation(root):
-    logging.info("Elevation extraction")
+    logging.debug("Elevation extraction")
 
     elevation_elements = root.findall(GPXElement.ELEVATION)
     elevations = [float(element.text) for element in elevation_elements]
@@ -0,0 +1,207 @@
+import logging
+import xml.etree.ElementTree as ET
+import numpy as np
+from domain.track_points import TrackPoints
+from gpx.gpx_read import LATITUDE_ATTRIBUTE, LONGITUDE_ATTRIBUTE
+
+GPX_NAMESPACE = 'http://www.topografix.com/GPX/1/1'
+TRACK_POINT_TAG = '{' + GPX_NAMESPACE + '}trkpt'
+ELEVATION_TAG = '{' + GPX_NAMESPACE + '}ele'
+NEW_LINE = '\n'
+STREAM_EVENTS = ('start-ns', 'start', 'end')
+OUTPUT_ENCODING = 'us-ascii'
+TEXT_ENTITIES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'))
+ATTRIBUTE_ENTITIES = TEXT_ENTITIES + (('"', '&quot;'), ('\n', '&#10;'), ('\r', '&#13;'), ('\t', '&#09;'))
+OUTPUT_BUFFER_SIZE = 4096
+
+class GPXStream:
+    # Elements are written as soon as their content is known and then dropped from the parsed tree.
+    # Track points are held back in chunks until their elevations are sampled.
+    def __init__(self, output, get_elevations, chunk_size):
+        self.output = output
+        self.get_elevations = get_elevations
+        self.chunk_size = chunk_size
+        self.prefixes = dict()
+        self.qualified_names = dict()
+        self.output_buffer = list()
+        self.pending_namespaces = list()
+        self.element_namespaces = dict()
+        self.open_elements = list()
+        self.tail_element = None
+        self.track_point_elements = list()
+        self.track_point_depth = 0
+        self.track_points_count = 0
+
+    def add_namespace(self, prefix, uri):
+        self.prefixes[uri] = prefix
+        self.pending_namespaces.append((prefix, uri))
+
+    def start(self, element):
+        if self.pending_namespaces:
+            self.element_namespaces[element] = self.pending_namespaces
+            self.pending_namespaces = list()
+
+        if self.track_point_depth:
+            self.track_point_depth += 1
+
+            return
+
+        if element.tag == TRACK_POINT_TAG and len(self.track_point_elements) < self.chunk_size:
+            self.write_pending_content()
+            self.track_point_depth = 1
+
+            return
+
+        self.flush_track_points()
+        self.write_pending_content()
+
+        if element.tag == TRACK_POINT_TAG:
+            self.track_point_depth = 1
+
+            return
+
+        self.open_elements.append([element, False])
+
+    def end(self, element):
+        if self.track_point_depth > 1:
+            self.track_point_depth -= 1
+
+            return
+
+        if self.track_point_depth == 1:
+            self.track_point_depth = 0
+            self.track_point_elements.append(element)
+            self.open_elements[-1][0].remove(element)
+
+            return
+
+        self.flush_track_points()
+        self.write_tail()
+
+        element, is_started = self.open_elements.pop()
+
+        if not is_started:
+            self.write_start_tag(element)
+            self.write(element.text)
+
+        self.write_markup('</' + self.get_qualified_name(element.tag) + '>')
+
+        if self.open_elements:
+            self.open_elements[-1][0].remove(element)
+
+        self.tail_element = element
+
+    def write_pending_content(self):
+        # the text of the parent and the tail of the previous sibling are complete once the next element starts
+        self.write_tail()
+
+        if self.open_elements and not self.open_elements[-1][1]:
+            parent = self.open_elements[-1][0]
+
+            self.write_start_tag(parent)
+            self.write(parent.text)
+            self.open_elements[-1][1] = True
+
+    def write_tail(self):
+        if self.tail_element is not None:
+            self.write(self.tail_element.tail)
+            self.tail_element = None
+
+    def flush_track_points(self):
+        if not self.track_point_elements:
+            return
+
+        lats = np.array([float(element.attrib[LATITUDE_ATTRIBUTE]) for element in self.track_point_elements])
+        lngs = np.array([float(element.attrib[LONGITUDE_ATTRIBUTE]) for element in self.track_point_elements])
+        elevations = self.get_elevations(TrackPoints(lngs, lats))
+
+        for element, elevation in zip(self.track_point_elements, elevations.tolist()):
+            ele = element.find(ELEVATION_TAG)
+
+            if ele is None:
+                ele = ET.SubElement(element, ELEVATION_TAG)
+                ele.tail = NEW_LINE
+
+            ele.text = str(elevation)
+
+            self.write_element(element)
+
+        self.track_points_count += len(self.track_point_elements)
+        self.track_point_elements = list()
+        self.flush_output()
+
+    def write_element(self, element):
+        self.write_start_tag(element)
+        self.write(element.text)
+
+        for child in element:
+            self.write_element(child)
+
+        self.write_markup('</' + self.get_qualified_name(element.tag) + '>')
+        self.write(element.tail)
+
+    def write_start_tag(self, element):
+        parts = ['<' + self.get_qualified_name(element.tag)]
+
+        for prefix, uri in self.element_namespaces.pop(element, ()):
+            parts.append(' xmlns' + (':' + prefix if prefix else '') + '="' + escape(uri, ATTRIBUTE_ENTITIES) + '"')
+
+        for name, value in element.attrib.items():
+            parts.append(' ' + self.get_qualified_name(name) + '="' + escape(value, ATTRIBUTE_ENTITIES) + '"')
+
+        parts.append('>')
+
+        self.write_markup(''.join(parts))
+
+    def get_qualified_name(self, tag):
+        qualified_name = self.qualified_names.get(tag)
+
+        if qualified_name is None:
+            qualified_name = tag
+
+            if tag[0] == '{':
+                uri, local_name = tag[1:].split('}', 1)
+                prefix = self.prefixes.get(uri)
+                qualified_name = prefix + ':' + local_name if prefix else local_name
+
+            self.qualified_names[tag] = qualified_name
+
+        return qualified_name
+
+    def write(self, text):
+        if text:
+            self.write_markup(escape(text, TEXT_ENTITIES))
+
+    def write_markup(self, markup):
+        self.output_buffer.append(markup)
+
+        if len(self.output_buffer) >= OUTPUT_BUFFER_SIZE:
+            self.flush_output()
+
+    def flush_output(self):
+        self.output.write(''.join(self.output_buffer).encode(OUTPUT_ENCODING, 'xmlcharrefreplace'))
+        self.output_buffer = list()
+
+def escape(text, entities):
+    for character, entity in entities:
+        if character in text:
+            text = text.replace(character, entity)
+
+    return text
+
+def rewrite_track_point_elevations(gpx_file, output, get_elevations, chunk_size):
+    logging.debug("Streamed elevation rewriting")
+
+    gpx_stream = GPXStream(output, get_elevations, chunk_size)
+
+    for event, value in ET.iterparse(gpx_file, events=STREAM_EVENTS):
+        if event == 'start-ns':
+            gpx_stream.add_namespace(*value)
+        elif event == 'start':
+            gpx_stream.start(value)
+        else:
+            gpx_stream.end(value)
+
+    gpx_stream.flush_output()
+
+    return gpx_stream.track_points_count
@@ -6,35 +6,38 @@ ELEVATION_TAG = 'ele'
 TRACK_POINT_TAG = 'trkpt'
 NEW_LINE = '\n'
 
-def replace_existing_elevations(root, approximated_elevations):
-    logging.info("Elevation replacement")
+def replace_existing_elevations(root, track_points):
+    logging.debug("Elevation replacement")
 
     elevation_elements = root.findall(GPXElement.ELEVATION)
 
-    for idx, element in enumerate(elevation_elements):
-        element.text = str(approximated_elevations[idx])
+    for element, elevation in zip(elevation_elements, track_points.elevations.tolist()):
+        element.text = str(elevation)
 
-def add_elevation_element(root, approximated_elevations):
-    logging.info("Elevation adding")
+def add_elevation_element(root, track_points):
+    logging.debug("Elevation adding")
 
-    track_points = root.findall(GPXElement.TRACK_POINT)
+    track_point_elements = root.findall(GPXElement.TRACK_POINT)
 
-    for idx, track_point in enumerate(track_points):
-        ele = ET.SubElement(track_point, ELEVATION_TAG)
-        ele.text = str(approximated_elevations[idx])
+    for track_point_element, elevation in zip(track_point_elements, track_points.elevations.tolist()):
+        ele = ET.SubElement(track_point_element, ELEVATION_TAG)
+        ele.text = str(elevation)
         ele.tail = NEW_LINE
 
-def add_track_points(root, approximated_elevations, generated_track_points):
-    logging.info("Track point adding")
+def add_track_points(root, generated_track_points):
+    logging.debug("Track point adding")
 
     track_segments = root.findall(GPXElement.TRACK_SEGMENT)
     last_track_segment = track_segments[-1]
+    lats = generated_track_points.lats.tolist()
+    lngs = generated_track_points.lngs.tolist()
+    elevations = generated_track_points.elevations.tolist()
 
-    for idx, track_point in enumerate(generated_track_points):
+    for lat, lng, elevation in zip(lats, lngs, elevations):
         track_point_element = ET.SubElement(
-            last_track_segment, TRACK_POINT_TAG, lat = str(track_point.lat), lon = str(track_point.lng)
+            last_track_segment, TRACK_POINT_TAG, lat = str(lat), lon = str(lng)
         )
         track_point_element.tail = NEW_LINE
         ele = ET.SubElement(track_point_element, ELEVATION_TAG)
-        ele.text = str(approximated_elevations[idx])
+        ele.text = str(elevation)
         ele.tail = NEW_LINE
\ No newline at end of file
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+# the workers share their metrics through this directory, it is set before the settings are read
+os.environ.setdefault('METRICS_DIRECTORY', os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+                                                        'elevation-service-metrics'))
+
+from config.settings import (SERVER_BIND, SERVER_GRACEFUL_TIMEOUT, SERVER_MAX_REQUESTS, SERVER_MAX_REQUESTS_JITTER, SERVER_THREADS,
+                                SERVER_TIMEOUT, SERVER_WORKERS)
+from dem.dem_registry import close_dem_datasets
+from dem.mosaic import close_dem_mosaics
+from service.dem_warm_up import preload_dem_files, warm_up_dems
+from service.instrumentation import clear_metrics_snapshots, start_metrics_snapshots, write_metrics_snapshot
+
+# gunicorn -c gunicorn.conf.py app:app
+bind = SERVER_BIND
+workers = SERVER_WORKERS
+worker_class = 'gthread'
+threads = SERVER_THREADS
+timeout = SERVER_TIMEOUT
+# workers are recycled after about SERVER_MAX_REQUESTS requests, the running requests get SERVER_GRACEFUL_TIMEOUT seconds to finish
+max_requests = SERVER_MAX_REQUESTS
+max_requests_jitter = SERVER_MAX_REQUESTS_JITTER
+graceful_timeout = SERVER_GRACEFUL_TIMEOUT
+# the application is imported once by the master and the workers are forked from it
+preload_app = True
+accesslog = '-'
+
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+def on_starting(server):
+    clear_metrics_snapshots()
+    preload_dem_files()
+
+def post_fork(server, worker):
+    # GDAL handles are not fork-safe, a worker opens its own
+    close_dem_datasets()
+    close_dem_mosaics()
+
+def post_worker_init(worker):
+    start_metrics_snapshots()
+    warm_up_dems()
+
+def worker_exit(server, worker):
+    # the last requests of the worker stay in the totals of /metrics
+    write_metrics_snapshot()
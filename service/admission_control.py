@@ -0,0 +1,115 @@
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from config.settings import (ADMISSION_CONCURRENCY, ADMISSION_HEAVY_LATTICE_POINTS, ADMISSION_MAX_MEMORY_MB, ADMISSION_QUEUE_SIZES,
+                                ADMISSION_QUEUE_TIMEOUT)
+from enumeration.cost_class import CostClass
+from enumeration.error_message import ErrorMessage
+from exception.admission_rejected_error import AdmissionRejectedError
+from exception.contour_too_large_error import ContourTooLargeError
+from service.geo import calculate_lattice_size, get_bounding_box
+from service.instrumentation import admission_rejections, admission_wait_duration
+
+BYTES_PER_MB = 1024 * 1024
+# Peak memory of a closed contour request for each generated lattice point, measured with tracemalloc.
+# Most of it are the GPX elements of the points kept in the lattice, which live until the response is sent.
+LATTICE_POINT_MEMORY = 700
+
+class CostEstimate:
+    def __init__(self, lattice_points_count, memory_mb, cost_class):
+        self.lattice_points_count = lattice_points_count
+        self.memory_mb = memory_mb
+        self.cost_class = cost_class
+
+class CostClassLimit:
+    # At most concurrency requests of the class run at once (0 is no limit), up to queue_size more wait for a slot
+    def __init__(self, cost_class, concurrency, queue_size):
+        self.cost_class = cost_class
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.running_count = 0
+        self.waiting_count = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout):
+        with self.condition:
+            if self.concurrency > 0 and self.running_count >= self.concurrency:
+                self.wait_for_slot(timeout)
+
+            self.running_count += 1
+
+    def wait_for_slot(self, timeout):
+        if self.waiting_count >= self.queue_size:
+            reject(self.cost_class, 'queue_full')
+
+        start = time.perf_counter()
+        self.waiting_count += 1
+
+        try:
+            is_admitted = self.condition.wait_for(lambda: self.running_count < self.concurrency, timeout)
+        finally:
+            self.waiting_count -= 1
+
+        admission_wait_duration.observe(time.perf_counter() - start, (self.cost_class,))
+
+        if not is_admitted:
+            reject(self.cost_class, 'timeout')
+
+    def release(self):
+        with self.condition:
+            self.running_count -= 1
+            self.condition.notify()
+
+# The limits belong to the process, each worker process of a server admits its own requests
+cost_class_limits = {
+    cost_class: CostClassLimit(cost_class, ADMISSION_CONCURRENCY.get(cost_class, 0), ADMISSION_QUEUE_SIZES.get(cost_class, 0))
+    for cost_class in (CostClass.LIGHT, CostClass.HEAVY)
+}
+
+def estimate_closed_contour_cost(track_points, offset):
+    # The lattice has a row every offset meters across the bounding box and one column more than rows,
+    # see generate_square_lattice_rows. Contours which would not fit in ADMISSION_MAX_MEMORY_MB are rejected.
+    lattice_size = int(calculate_lattice_size(get_bounding_box(track_points)))
+    rows_count = max(0, math.ceil((lattice_size - offset) / offset))
+    lattice_points_count = rows_count * (rows_count + 1)
+    memory_mb = lattice_points_count * LATTICE_POINT_MEMORY / BYTES_PER_MB
+    cost_class = CostClass.HEAVY if lattice_points_count >= ADMISSION_HEAVY_LATTICE_POINTS else CostClass.LIGHT
+
+    logging.debug("Estimated %d lattice points, %.1f MB", lattice_points_count, memory_mb)
+
+    if memory_mb > ADMISSION_MAX_MEMORY_MB:
+        admission_rejections.increment((cost_class, 'too_large'))
+
+        raise ContourTooLargeError(ErrorMessage.CONTOUR_TOO_LARGE)
+
+    return CostEstimate(lattice_points_count, memory_mb, cost_class)
+
+@contextmanager
+def admit_request(cost_class):
+    cost_class_limit = cost_class_limits[cost_class]
+    cost_class_limit.acquire(ADMISSION_QUEUE_TIMEOUT)
+
+    try:
+        yield
+    finally:
+        cost_class_limit.release()
+
+def admit_closed_contour(cost_estimate):
+    return admit_request(cost_estimate.cost_class)
+
+def hold_closed_contour_admission(admission, cost_estimate):
+    # the slot is entered into the admission ExitStack and released when it is closed, not when the returned context exits
+    admission.enter_context(admit_closed_contour(cost_estimate))
+
+    return nullcontext()
+
+@contextmanager
+def admit_without_limit(cost_estimate):
+    yield
+
+def reject(cost_class, reason):
+    admission_rejections.increment((cost_class, reason))
+
+    raise AdmissionRejectedError(ErrorMessage.SERVER_BUSY)
@@ -1,28 +1,67 @@
 import logging
+import numpy as np
+from config.settings import FUSION_WEIGHTS
 from enumeration.dem_data_source import DEMDataSource
 
 MAX_DIFFERENCE = 2.0
+NO_ELEVATION = 0.0
+DEFAULT_WEIGHT = 1.0
+REFERENCE_DEM_DATA_SOURCE = DEMDataSource.SRTM_90_M
 
-def calculate_approximated_elevations(elevations, track_points):
-    logging.info("Elevation approximation")
-
-    srtm_30m = elevations[DEMDataSource.SRTM_30_M]
-    srtm_90m = elevations[DEMDataSource.SRTM_90_M]
-    aw_3d_30m = elevations[DEMDataSource.ALOS_WORLD_3D_30_M]
-    elevations = list()
-
-    for idx in range(len(track_points)):
-        srtm_30m_elevation = srtm_30m[idx]
-        srtm_90m_elevation = srtm_90m[idx]
-        aw_3d_30m_elevation = aw_3d_30m[idx]
-        
-        elevation = None
-        if (abs(srtm_90m_elevation-srtm_30m_elevation) > MAX_DIFFERENCE 
-                or abs(srtm_90m_elevation-aw_3d_30m_elevation) > MAX_DIFFERENCE):
-            elevation = (srtm_30m_elevation+aw_3d_30m_elevation) / 2
-        else:
-            elevation = (srtm_30m_elevation+srtm_90m_elevation+aw_3d_30m_elevation) / 3
-        
-        elevations.append(elevation)
-
-    return elevations
\ No newline at end of file
+def calculate_approximated_elevations(elevations, track_points, no_data_values=None):
+    logging.debug("Elevation approximation")
+
+    return fuse_elevations(elevations, FUSION_WEIGHTS, no_data_values)
+
+def fuse_elevations(elevations, weights=None, no_data_values=None, reference_dem_data_source=REFERENCE_DEM_DATA_SOURCE,
+                    dtype=np.float64, no_elevation=NO_ELEVATION):
+    # The reference source is left out wherever it differs by more than MAX_DIFFERENCE from any other source,
+    # the result is the weighted mean of the remaining sources. Sources are summed in the order of the dict.
+    # The fused raster is built in float32, the precision of the file it is written to, and marks the points without data as nodata.
+    weights = weights or dict()
+    no_data_values = no_data_values or dict()
+    source_elevations = {
+        dem_data_source: np.asarray(source_elevation, dtype=dtype)
+        for dem_data_source, source_elevation in elevations.items()
+    }
+    valid = {
+        dem_data_source: get_valid_mask(source_elevation, no_data_values.get(dem_data_source))
+        for dem_data_source, source_elevation in source_elevations.items()
+    }
+    include = dict(valid)
+
+    if reference_dem_data_source in source_elevations:
+        reference = source_elevations[reference_dem_data_source]
+        reference_differs = np.zeros(reference.shape, dtype=bool)
+
+        for dem_data_source, source_elevation in source_elevations.items():
+            if dem_data_source != reference_dem_data_source:
+                reference_differs |= valid[dem_data_source] & (np.abs(reference - source_elevation) > MAX_DIFFERENCE)
+
+        include[reference_dem_data_source] = valid[reference_dem_data_source] & ~reference_differs
+
+    points_count = len(next(iter(source_elevations.values()))) if source_elevations else 0
+    weighted_sum = np.zeros(points_count, dtype=dtype)
+    weight_sum = np.zeros(points_count, dtype=dtype)
+
+    for dem_data_source, source_elevation in source_elevations.items():
+        weight = weights.get(dem_data_source, DEFAULT_WEIGHT)
+        weighted_sum += np.where(include[dem_data_source], weight * source_elevation, 0.0)
+        weight_sum += np.where(include[dem_data_source], weight, 0.0)
+
+    fused_elevations = np.full(points_count, no_elevation, dtype=dtype)
+    np.divide(weighted_sum, weight_sum, out=fused_elevations, where=weight_sum > 0)
+
+    return fused_elevations
+
+def fill_missing_elevations(elevations):
+    # the points which no DEM covers get NO_ELEVATION, as the fusion gives them
+    return np.where(np.isnan(elevations), NO_ELEVATION, elevations)
+
+def get_valid_mask(source_elevation, no_data_value):
+    valid = ~np.isnan(source_elevation)
+
+    if no_data_value is not None:
+        valid &= source_elevation != no_data_value
+
+    return valid
@@ -0,0 +1,331 @@
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config.settings import JOB_DIRECTORY, JOB_QUEUE_SIZE, JOB_RETENTION, JOB_WORKERS
+from enumeration.error_message import ErrorMessage
+from enumeration.job_stage import JobStage
+from enumeration.job_status import JobStatus
+from enumeration.status_code import StatusCode
+from exception.contour_too_large_error import ContourTooLargeError
+from exception.dem_error import DEMError
+from exception.job_failed_error import JobFailedError
+from exception.job_not_finished_error import JobNotFinishedError
+from exception.job_not_found_error import JobNotFoundError
+from exception.job_queue_full_error import JobQueueFullError
+from exception.lattice_generation_error import LatticeGenerationError
+from exception.request_error import RequestError
+from service.gpx_response import send_gpx_file
+from service.request_handler import GPX_NAMESPACE, add_square_lattice_points, get_offset, validate_closed_contour_parts
+
+JOB_STAGES = [JobStage.BOUNDING_BOX, JobStage.LATTICE, JobStage.CLEARING, JobStage.RESTORE,
+                JobStage.VALIDATION, JobStage.SAMPLING, JobStage.WRITE]
+JOB_ID_PATTERN = re.compile('[0-9a-f]{32}')
+INPUT_FILE_NAME = 'input.gpx'
+RESULT_FILE_NAME = 'result.gpx'
+STATUS_FILE_NAME = 'status.json'
+TEMPORARY_FILE_EXTENSION = '.tmp'
+ERROR_STATUS_CODES = [
+    (RequestError, StatusCode.BAD_REQUEST),
+    (LatticeGenerationError, StatusCode.UNPROCESSABLE_ENTITY),
+    (ContourTooLargeError, StatusCode.PAYLOAD_TOO_LARGE),
+    (DEMError, StatusCode.SERVICE_UNAVAILABLE)
+]
+
+# Jobs are kept on disk, so any web worker process can answer the polling of a job submitted to another one
+job_executor = None
+job_executor_lock = threading.Lock()
+pending_jobs_count = 0
+
+class JobProgress:
+    # Runs in the job process and writes the status file each time the pipeline enters a new stage
+    def __init__(self, job_directory, status):
+        self.job_directory = job_directory
+        self.status = status
+        self.stage_start_time = None
+
+    def report_stage(self, stage):
+        self.finish_stage()
+
+        self.status['stage'] = stage
+        self.get_stage(stage)['status'] = JobStatus.RUNNING
+        self.stage_start_time = time.perf_counter()
+
+        write_job_status(self.job_directory, self.status)
+
+    def finish_stage(self):
+        stage = self.status['stage']
+
+        if stage is not None:
+            self.get_stage(stage)['status'] = JobStatus.DONE
+            self.get_stage(stage)['duration'] = time.perf_counter() - self.stage_start_time
+
+    def get_stage(self, stage):
+        return self.status['stages'][JOB_STAGES.index(stage)]
+
+def submit_closed_contour_job(received_gpx_file, received_offset):
+    global pending_jobs_count
+
+    validate_closed_contour_parts(received_gpx_file, received_offset)
+    remove_expired_jobs()
+
+    with job_executor_lock:
+        if pending_jobs_count >= JOB_QUEUE_SIZE:
+            raise JobQueueFullError(ErrorMessage.JOB_QUEUE_FULL)
+
+        pending_jobs_count += 1
+
+    try:
+        job_id = uuid.uuid4().hex
+        job_directory = get_job_directory(job_id)
+
+        os.makedirs(job_directory)
+        received_gpx_file.save(os.path.join(job_directory, INPUT_FILE_NAME))
+
+        status = create_job_status(job_id, received_gpx_file.filename)
+        write_job_status(job_directory, status)
+
+        executor = get_job_executor()
+        future = executor.submit(run_closed_contour_job, job_directory, get_offset(received_offset))
+    except BrokenProcessPool:
+        finish_pending_job()
+        discard_job_executor(executor)
+
+        raise
+    except:
+        finish_pending_job()
+
+        raise
+
+    future.add_done_callback(lambda future: handle_finished_job(job_directory, executor, future))
+    logging.info("Submitted closed contour job %s", job_id)
+
+    return get_public_job_status(status)
+
+def get_job_executor():
+    global job_executor
+
+    with job_executor_lock:
+        if job_executor is None:
+            # spawned workers do not inherit the threads and GDAL handles of the web process
+            job_executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+
+        return job_executor
+
+def discard_job_executor(executor):
+    # a broken pool is replaced only once, the callbacks of its other jobs leave a newer pool alone
+    global job_executor
+
+    with job_executor_lock:
+        if job_executor is not executor:
+            return
+
+        job_executor = None
+
+    executor.shutdown(wait=False)
+
+def handle_finished_job(job_directory, executor, future):
+    finish_pending_job()
+
+    # an exception here means the job process itself was lost, the job reports its own errors
+    if future.exception() is None:
+        return
+
+    logging.error("Closed contour job in %s was interrupted: %s", job_directory, future.exception())
+    discard_job_executor(executor)
+
+    try:
+        status = read_job_status(job_directory)
+    except OSError:
+        return
+
+    if status['status'] not in (JobStatus.DONE, JobStatus.FAILED):
+        set_job_error(status, ErrorMessage.JOB_INTERRUPTED, StatusCode.INTERNAL_SERVER_ERROR)
+        write_job_status(job_directory, status)
+
+def finish_pending_job():
+    global pending_jobs_count
+
+    with job_executor_lock:
+        pending_jobs_count -= 1
+
+def run_closed_contour_job(job_directory, offset):
+    logging.basicConfig(level=logging.INFO)
+    ET.register_namespace('', GPX_NAMESPACE)
+
+    status = read_job_status(job_directory)
+    status['status'] = JobStatus.RUNNING
+    set_job_owner(status)
+    job_progress = JobProgress(job_directory, status)
+
+    write_job_status(job_directory, status)
+
+    try:
+        try:
+            tree = ET.parse(os.path.join(job_directory, INPUT_FILE_NAME))
+        except ET.ParseError:
+            raise RequestError(ErrorMessage.INVALID_GPX)
+
+        add_square_lattice_points(tree.getroot(), offset, job_progress.report_stage)
+
+        result_file = os.path.join(job_directory, RESULT_FILE_NAME)
+        tree.write(result_file + TEMPORARY_FILE_EXTENSION)
+        os.replace(result_file + TEMPORARY_FILE_EXTENSION, result_file)
+
+        job_progress.finish_stage()
+        status['status'] = JobStatus.DONE
+    except Exception as error:
+        status_code = get_error_status_code(error)
+
+        if status_code == StatusCode.INTERNAL_SERVER_ERROR:
+            logging.exception("Closed contour job in %s failed", job_directory)
+            set_job_error(status, ErrorMessage.JOB_FAILED, status_code)
+        else:
+            set_job_error(status, str(error), status_code)
+
+    write_job_status(job_directory, status)
+
+def get_error_status_code(error):
+    for error_type, status_code in ERROR_STATUS_CODES:
+        if isinstance(error, error_type):
+            return status_code
+
+    return StatusCode.INTERNAL_SERVER_ERROR
+
+def get_job_status(job_id):
+    job_directory = get_job_directory(validate_job_id(job_id))
+
+    try:
+        status = fail_interrupted_job(job_directory, read_job_status(job_directory))
+    except OSError:
+        raise JobNotFoundError(ErrorMessage.JOB_NOT_FOUND)
+
+    return get_public_job_status(status)
+
+def send_job_result(job_id, accepts_gzip=False):
+    status = get_job_status(job_id)
+
+    if status['status'] == JobStatus.FAILED:
+        raise JobFailedError(status['error']['message'], status['error']['status_code'])
+
+    if status['status'] != JobStatus.DONE:
+        raise JobNotFinishedError(ErrorMessage.JOB_NOT_FINISHED)
+
+    try:
+        result_file = open(os.path.join(get_job_directory(job_id), RESULT_FILE_NAME), 'rb')
+    except OSError:
+        raise JobNotFoundError(ErrorMessage.JOB_NOT_FOUND)
+
+    return send_gpx_file(result_file, status['file_name'], accepts_gzip)
+
+def remove_expired_jobs():
+    # finished jobs are kept for JOB_RETENTION seconds after their last status change
+    if not os.path.isdir(JOB_DIRECTORY):
+        return
+
+    now = time.time()
+
+    for entry in os.scandir(JOB_DIRECTORY):
+        if not JOB_ID_PATTERN.fullmatch(entry.name):
+            continue
+
+        try:
+            status_file = os.path.join(entry.path, STATUS_FILE_NAME)
+            status = fail_interrupted_job(entry.path, read_job_status(entry.path))
+            is_expired = now - os.path.getmtime(status_file) > JOB_RETENTION
+            is_finished = status['status'] in (JobStatus.DONE, JobStatus.FAILED)
+        except (OSError, ValueError):
+            continue
+
+        if is_expired and is_finished:
+            logging.info("Remove expired job %s", entry.name)
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+def fail_interrupted_job(job_directory, status):
+    # A job whose owner process is gone, e.g. a web worker which was recycled or killed with its queue,
+    # never gets a done callback. It is failed here, so it can be polled to an end and expire.
+    if status['status'] in (JobStatus.DONE, JobStatus.FAILED) or is_job_owner_alive(status):
+        return status
+
+    # the job may have finished just before its process exited
+    status = read_job_status(job_directory)
+
+    if status['status'] not in (JobStatus.DONE, JobStatus.FAILED):
+        logging.error("Closed contour job in %s lost its process %s", job_directory, status['owner']['pid'])
+
+        set_job_error(status, ErrorMessage.JOB_INTERRUPTED, StatusCode.INTERNAL_SERVER_ERROR)
+        write_job_status(job_directory, status)
+
+    return status
+
+def is_job_owner_alive(status):
+    # the processes of other hosts sharing JOB_DIRECTORY cannot be checked and are taken as alive
+    owner = status.get('owner')
+
+    if owner is None or owner['host'] != socket.gethostname():
+        return True
+
+    try:
+        os.kill(owner['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+def create_job_status(job_id, file_name):
+    status = {
+        'job_id': job_id,
+        'file_name': file_name,
+        'status': JobStatus.QUEUED,
+        'stage': None,
+        'stages': [{'stage': stage, 'status': JobStatus.QUEUED, 'duration': None} for stage in JOB_STAGES],
+        'error': None
+    }
+    set_job_owner(status)
+
+    return status
+
+def set_job_owner(status):
+    # a queued job belongs to the web process which submitted it, a running one to its job process
+    status['owner'] = {'host': socket.gethostname(), 'pid': os.getpid()}
+
+def get_public_job_status(status):
+    return {key: value for key, value in status.items() if key != 'owner'}
+
+def set_job_error(status, message, status_code):
+    status['status'] = JobStatus.FAILED
+    status['error'] = {'message': message, 'status_code': status_code}
+
+def read_job_status(job_directory):
+    with open(os.path.join(job_directory, STATUS_FILE_NAME)) as file:
+        return json.load(file)
+
+def write_job_status(job_directory, status):
+    # the status is replaced at once, so a poll never reads a half written file
+    file_descriptor, temporary_file = tempfile.mkstemp(dir=job_directory, suffix=TEMPORARY_FILE_EXTENSION)
+
+    with os.fdopen(file_descriptor, 'w') as file:
+        json.dump(status, file)
+
+    os.replace(temporary_file, os.path.join(job_directory, STATUS_FILE_NAME))
+
+def get_job_directory(job_id):
+    return os.path.join(JOB_DIRECTORY, job_id)
+
+def validate_job_id(job_id):
+    if not JOB_ID_PATTERN.fullmatch(job_id):
+        raise JobNotFoundError(ErrorMessage.JOB_NOT_FOUND)
+
+    return job_id
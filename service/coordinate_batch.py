@@ -0,0 +1,53 @@
+import json
+import numpy as np
+from flask import Response
+from domain.track_points import TrackPoints
+from enumeration.error_message import ErrorMessage
+from enumeration.mime_type import MimeType
+from exception.request_error import RequestError
+
+BINARY_COORDINATE_TYPE = np.dtype('<f8')
+COORDINATE_PAIR_SIZE = 2 * BINARY_COORDINATE_TYPE.itemsize
+
+def parse_coordinates(body, mimetype):
+    if mimetype == MimeType.JSON:
+        coordinates = parse_json_coordinates(body)
+    elif mimetype == MimeType.OCTET_STREAM:
+        coordinates = parse_binary_coordinates(body)
+    else:
+        raise RequestError(ErrorMessage.UNSUPPORTED_CONTENT_TYPE)
+
+    if not len(coordinates):
+        raise RequestError(ErrorMessage.TRACK_POINTS_NOT_FOUND)
+
+    if not np.isfinite(coordinates).all():
+        raise RequestError(ErrorMessage.INVALID_COORDINATES)
+
+    return TrackPoints(coordinates[:, 0], coordinates[:, 1])
+
+def parse_json_coordinates(body):
+    try:
+        coordinates = np.array(json.loads(body), dtype=np.float64)
+    except (ValueError, TypeError):
+        raise RequestError(ErrorMessage.INVALID_COORDINATES)
+
+    if coordinates.ndim != 2 or coordinates.shape[1] != 2:
+        if coordinates.size == 0:
+            return coordinates.reshape(0, 2)
+
+        raise RequestError(ErrorMessage.INVALID_COORDINATES)
+
+    return coordinates
+
+def parse_binary_coordinates(body):
+    if len(body) % COORDINATE_PAIR_SIZE:
+        raise RequestError(ErrorMessage.INVALID_BINARY_COORDINATES)
+
+    return np.frombuffer(body, dtype=BINARY_COORDINATE_TYPE).reshape(-1, 2)
+
+def send_elevations(elevations, mimetype):
+    # the elevations are returned in the format of the request
+    if mimetype == MimeType.OCTET_STREAM:
+        return Response(elevations.astype(BINARY_COORDINATE_TYPE).tobytes(), mimetype=MimeType.OCTET_STREAM)
+
+    return Response(json.dumps(elevations.tolist()), mimetype=MimeType.JSON)
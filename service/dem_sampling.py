@@ -0,0 +1,69 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from config.settings import DEM_DATA_SOURCES, DEM_SAMPLING_TIMEOUT, DEM_SAMPLING_WORKERS
+from dem.dem_reader import extract_elevations_from_dem
+from exception.dem_error import DEMError
+from service.instrumentation import dem_sampling_duration, dem_sampling_timeouts
+from service.request_profiling import profile_worker
+
+# GDAL releases the GIL while reading, so the sources are read in parallel on threads
+sampling_executor = ThreadPoolExecutor(max_workers=DEM_SAMPLING_WORKERS, thread_name_prefix='dem-sampling')
+
+class SamplingTask:
+    # The timeout of a source starts when its read starts, the time spent waiting for a thread of the pool is not counted
+    def __init__(self, dem_data_source, track_points):
+        self.dem_data_source = dem_data_source
+        self.track_points = track_points
+        self.started = threading.Event()
+        self.start_time = None
+
+    def run(self):
+        self.start_time = time.monotonic()
+        self.started.set()
+
+        return timed_extract_elevations_from_dem(self.dem_data_source, self.track_points)
+
+def sample_dem_data_sources(track_points, dem_data_sources=DEM_DATA_SOURCES, timeout=DEM_SAMPLING_TIMEOUT):
+    # A source which does not start within timeout seconds or is not read within timeout seconds after it started
+    # fails the request, its points would otherwise be fused from fewer sources without notice.
+    logging.debug("Sample DEM data sources")
+
+    tasks = [SamplingTask(dem_data_source, track_points) for dem_data_source in dem_data_sources]
+    futures = [(task, sampling_executor.submit(profile_worker(task.run))) for task in tasks]
+    elevations = dict()
+    sampling_times = dict()
+
+    try:
+        for task, future in futures:
+            elevations[task.dem_data_source], sampling_times[task.dem_data_source] = wait_for_task(task, future, timeout)
+    except:
+        for _, future in futures:
+            future.cancel()
+
+        raise
+
+    return elevations, sampling_times
+
+def wait_for_task(task, future, timeout):
+    try:
+        if not task.started.wait(timeout):
+            raise TimeoutError()
+
+        return future.result(max(0.0, task.start_time + timeout - time.monotonic()))
+    except TimeoutError:
+        logging.warning("Sampling %s timed out after %.3f s", task.dem_data_source, timeout)
+        dem_sampling_timeouts.increment((task.dem_data_source,))
+
+        raise DEMError('Sampling DEM data source %s timed out' % task.dem_data_source)
+
+def timed_extract_elevations_from_dem(dem_data_source, track_points):
+    start = time.perf_counter()
+    elevations = extract_elevations_from_dem(dem_data_source, track_points)
+    sampling_time = time.perf_counter() - start
+
+    dem_sampling_duration.observe(sampling_time, (dem_data_source,))
+    logging.debug("Sampled %s in %.3f s", dem_data_source, sampling_time)
+
+    return elevations, sampling_time
@@ -0,0 +1,98 @@
+import logging
+import os
+import threading
+import numpy as np
+from config.settings import DEM_BACKEND, ELEVATION_SERVING_MODE
+from dem.dem_reader import extract_elevations_from_dem, get_dem, get_served_dem_data_sources
+from dem.dem_registry import get_dem_file
+from dem.tiled_store import get_tiled_file
+from domain.track_points import TrackPoints
+from enumeration.dem_backend import DEMBackend
+from enumeration.dem_data_source import DEMDataSource
+from enumeration.serving_mode import ServingMode
+from exception.dem_error import DEMError
+from service.dem_sampling import sample_dem_data_sources
+
+dems_ready = threading.Event()
+warm_up_lock = threading.Lock()
+warm_up_error = None
+
+def preload_dem_files():
+    # Runs in the master process of the server before the workers are forked. Only the OS page cache,
+    # which all workers share, is filled. GDAL handles opened here would be inherited by every worker.
+    if not hasattr(os, 'posix_fadvise'):
+        return
+
+    for dem_file in get_served_dem_files():
+        try:
+            file_descriptor = os.open(dem_file, os.O_RDONLY)
+        except OSError as error:
+            logging.warning("Cannot preload DEM file %s: %s", dem_file, error)
+
+            continue
+
+        try:
+            os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(file_descriptor)
+
+def warm_up_dems():
+    # Runs in each worker after the fork. The DEMs are loaded and the center of each one is read on the
+    # sampling threads, so the first requests find the datasets and their handles open.
+    # Any error leaves the worker running but not ready, a failing worker would otherwise be forked again and again.
+    global warm_up_error
+
+    with warm_up_lock:
+        if dems_ready.is_set():
+            return True
+
+        try:
+            dem_data_sources = get_served_dem_data_sources()
+            center_lngs, center_lats = zip(*(get_center(get_dem(dem_data_source)) for dem_data_source in dem_data_sources))
+            track_points = TrackPoints(np.array(center_lngs), np.array(center_lats))
+
+            if ELEVATION_SERVING_MODE == ServingMode.FUSED:
+                extract_elevations_from_dem(DEMDataSource.FUSED, track_points)
+            else:
+                sample_dem_data_sources(track_points, dem_data_sources)
+        except DEMError as error:
+            logging.error("DEM warm-up failed: %s", error)
+            warm_up_error = str(error)
+
+            return False
+        except Exception as error:
+            logging.exception("DEM warm-up failed")
+            warm_up_error = '%s: %s' % (type(error).__name__, error)
+
+            return False
+
+        logging.info("DEMs are ready")
+        warm_up_error = None
+        dems_ready.set()
+
+        return True
+
+def is_ready():
+    # a failed warm-up is tried again, e.g. when the DEM files are mounted after the start
+    return dems_ready.is_set() or warm_up_dems()
+
+def get_warm_up_error():
+    return warm_up_error
+
+def get_center(dem):
+    if DEM_BACKEND == DEMBackend.MOSAIC:
+        return dem.get_tile_center()
+
+    gt = dem.geo_transform
+
+    return gt[0] + gt[1] * dem.x_size / 2.0, gt[3] + gt[5] * dem.y_size / 2.0
+
+def get_served_dem_files():
+    # the tiles of a mosaic are only read ahead when they are opened
+    if DEM_BACKEND == DEMBackend.MOSAIC:
+        return []
+
+    if DEM_BACKEND == DEMBackend.TILED:
+        return [get_tiled_file(dem_data_source) for dem_data_source in get_served_dem_data_sources()]
+
+    return [get_dem_file(dem_data_source) for dem_data_source in get_served_dem_data_sources()]
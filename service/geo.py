@@ -1,46 +1,37 @@
 import logging
-from math import radians, cos, sin, asin, sqrt, atan2, degrees
-from shapely.geometry import Point, Polygon
+from itertools import chain
+from math import radians, cos, sin, sqrt, atan2, degrees
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
 from domain.location import Location
+from domain.square_lattice import SquareLattice
+from domain.track_points import TrackPoints
 from enumeration.error_message import ErrorMessage
 from exception.lattice_generation_error import LatticeGenerationError
+from service.instrumentation import lattice_points
 
 SOUTH_WEST_COORDINATES = 'south-west'
 NORTH_EAST_COORDINATES = 'north-east'
 ONE_DEGREE_LATITUDE_IN_METERS = 111_111.0
+LATTICE_COORDINATE_TOLERANCE = 1e-9
 
 def get_bounding_box(track_points):
-    logging.info("Bounding box calculation")
+    logging.debug("Bounding box calculation")
 
-    min_lat = 90.0
-    min_lng = 180.0
-    max_lat = -90.0
-    max_lng = -180.0
     bounding_box = {}
+    min_lat = np.min(track_points.lats, initial=90.0)
+    min_lng = np.min(track_points.lngs, initial=180.0)
+    max_lat = np.max(track_points.lats, initial=-90.0)
+    max_lng = np.max(track_points.lngs, initial=-180.0)
 
-    for point in track_points:
-        lat = point.lat
-        lng = point.lng
-
-        if min_lat > lat:
-            min_lat = lat
-
-        if min_lng > lng:
-            min_lng = lng
-
-        if max_lat < lat: 
-            max_lat = lat
-
-        if max_lng < lng:
-            max_lng = lng
-
-    bounding_box[SOUTH_WEST_COORDINATES] = Location(min_lng, min_lat)
-    bounding_box[NORTH_EAST_COORDINATES] = Location(max_lng, max_lat)
+    bounding_box[SOUTH_WEST_COORDINATES] = Location(float(min_lng), float(min_lat))
+    bounding_box[NORTH_EAST_COORDINATES] = Location(float(max_lng), float(max_lat))
 
     return bounding_box
 
 def calculate_lattice_size(bounding_box):
-    logging.info("Lattice size's calculation")
+    logging.debug("Lattice size's calculation")
 
     min_location = bounding_box[SOUTH_WEST_COORDINATES]
     max_location = bounding_box[NORTH_EAST_COORDINATES]
@@ -62,6 +53,26 @@ def find_distance(prev_point_lng, prev_point_lat, current_point_lng, current_poi
 
     return 6_371_000.00*dist
 
+def find_distances(prev_point_lngs, prev_point_lats, current_point_lngs, current_point_lats):
+    # array version of find_distance, the arguments are broadcast against each other
+    latitude_difference = np.radians(np.abs(current_point_lats - prev_point_lats))
+    longitude_difference = np.radians(np.abs(current_point_lngs - prev_point_lngs))
+    x = np.sin(latitude_difference/2.0) * np.sin(latitude_difference/2.0) + np.cos(
+        np.radians(prev_point_lats)) * np.cos(np.radians(current_point_lats)) * np.sin(longitude_difference/2.0) * np.sin(
+            longitude_difference/2.0)
+
+    dist = 2 * np.arctan2(np.sqrt(x), np.sqrt(1-x))
+
+    return 6_371_000.00*dist
+
+def find_row_distances(lngs, lats):
+    # distances between neighbouring points along the last axis
+    return find_distances(lngs[..., :-1], lats[..., :-1], lngs[..., 1:], lats[..., 1:])
+
+def find_adjacent_row_distances(lngs, lats):
+    # distances between the points of each row and the points of the next row
+    return find_distances(lngs[:-1], lats[:-1], lngs[1:], lats[1:])
+
 def calculate_bearing(prev_point, next_point):
     prev_point_lat = radians(prev_point.lat)
     prev_point_lng = radians(prev_point.lng)
@@ -75,157 +86,180 @@ def calculate_bearing(prev_point, next_point):
 
     return (bearing + 360.00) % 360.00
 
-def calculate_next_point(prev_point, offset, bearing):
-    r = 6371.00 * 1000.00
-    angular_distance = offset / r
-    prev_point_lat = radians(prev_point.lat)
-    prev_point_lng = radians(prev_point.lng)
+def calculate_bearings(prev_point_lngs, prev_point_lats, next_point_lngs, next_point_lats):
+    # array version of calculate_bearing, the arguments are broadcast against each other
+    prev_point_lats = np.radians(prev_point_lats)
+    next_point_lats = np.radians(next_point_lats)
+    dl = np.radians(next_point_lngs) - np.radians(prev_point_lngs)
+    x = np.cos(prev_point_lats) * np.sin(next_point_lats) - (np.sin(prev_point_lats) * np.cos(next_point_lats) * np.cos(dl))
+    y = np.cos(prev_point_lats) * np.sin(dl)
 
-    next_point_lat = asin(sin(prev_point_lat) * cos(angular_distance)
-                + cos(prev_point_lat) * sin(angular_distance) * cos(bearing))
+    bearings = np.degrees(np.arctan2(y, x))
 
-    next_point_lng = prev_point_lng + atan2(sin(bearing) * sin(angular_distance) * cos(prev_point_lat),
-                cos(angular_distance) - sin(prev_point_lat) * sin(next_point_lat))
-
-    return Location(degrees(next_point_lng), degrees(next_point_lat))
+    return (bearings + 360.00) % 360.00
 
 def generate_square_lattice(meter_offset, lattice_size, bounding_box):
-    logging.info("Lattice generation")
+    logging.debug("Lattice generation")
 
-    square_lattice = list()
-    min_location = bounding_box[SOUTH_WEST_COORDINATES]
+    min_lng = bounding_box[SOUTH_WEST_COORDINATES].lng
+    row_lats, longitude_steps = generate_square_lattice_rows(meter_offset, lattice_size, bounding_box)
+    first_column_lngs = min_lng + longitude_steps * 0.0
+    second_column_lngs = min_lng + longitude_steps * 1.0
+    column_spacings = np.array([find_distance(first_lng, row_lat, second_lng, row_lat)
+                                    for first_lng, second_lng, row_lat in zip(first_column_lngs.tolist(), second_column_lngs.tolist(), row_lats.tolist())])
 
-    for i in range(meter_offset, lattice_size, meter_offset):
-        next_row = list()
+    square_lattice = SquareLattice(row_lats, longitude_steps, min_lng, column_spacings)
+    lattice_points.observe(square_lattice.rows_count * square_lattice.columns_count, ('generated',))
 
-        lat_offset = radians(i/ONE_DEGREE_LATITUDE_IN_METERS)
-        new_lat = min_location.lat + degrees(lat_offset)
-        next_row_start_point = Location(min_location.lng, new_lat)
+    return square_lattice
 
-        next_row.append(next_row_start_point)
+def generate_square_lattice_rows(meter_offset, lattice_size, bounding_box):
+    # Returns the latitude and the longitude step of every row, the lattice has rows + 1 columns. Every row starts
+    # at the western edge of the bounding box, the longitudes match the point by point construction within
+    # LATTICE_COORDINATE_TOLERANCE.
+    min_location = bounding_box[SOUTH_WEST_COORDINATES]
+    row_meter_offsets = np.arange(meter_offset, lattice_size, meter_offset, dtype=np.float64)
+    row_lats = min_location.lat + np.degrees(np.radians(row_meter_offsets / ONE_DEGREE_LATITUDE_IN_METERS))
+    longitude_steps = calculate_longitude_steps(row_lats, meter_offset)
 
-        k = 1
-        for _ in range(meter_offset, lattice_size, meter_offset):
-            prev_point = next_row[k - 1]
-            new_lng = calculate_next_point_longitude(prev_point, meter_offset)
-            next_point = Location(new_lng, prev_point.lat)
+    return row_lats, longitude_steps
 
-            next_row.append(next_point)
+def calculate_longitude_steps(lats, meter_offset):
+    # The step between neighbouring points only depends on the latitude of the row. It is the longitude
+    # difference of the point reached after meter_offset meters along the bearing towards the point
+    # meter_offset / (one degree * cos(lat)) degrees to the east, the bearing in degrees is used as radians.
+    r = 6371.00 * 1000.00
+    angular_distance = meter_offset / r
+    lat = np.radians(lats)
+    lng_offsets = np.degrees(np.radians(meter_offset / (ONE_DEGREE_LATITUDE_IN_METERS * np.cos(lat))))
+    bearing = calculate_bearings(0.0, lats, lng_offsets, lats)
 
-            k += 1
+    next_lat = np.arcsin(np.sin(lat) * np.cos(angular_distance)
+                + np.cos(lat) * np.sin(angular_distance) * np.cos(bearing))
 
-        square_lattice.append(next_row)
+    return np.degrees(np.arctan2(np.sin(bearing) * np.sin(angular_distance) * np.cos(lat),
+                np.cos(angular_distance) - np.sin(lat) * np.sin(next_lat)))
 
-    return square_lattice
+def clear_points(original_route_points, square_lattice):
+    logging.debug("Clear points which do not lie inside the square lattice")
 
-def calculate_next_point_longitude(prev_point, meter_offset):
-    prev_lat = prev_point.lat
-    prev_lng = prev_point.lng
+    lats, lngs = square_lattice.get_band_coordinates(0, square_lattice.rows_count)
+    square_lattice.inside = find_points_inside_polygon(original_route_points, lats, lngs)
 
-    lng_offset = radians(meter_offset /  (ONE_DEGREE_LATITUDE_IN_METERS * cos(radians(prev_lat))))
-    tmp_lng = prev_lng + degrees(lng_offset)
-    tmp_next_point = Location(tmp_lng, prev_lat)
+    return square_lattice
 
-    bearing = calculate_bearing(prev_point, tmp_next_point)
-    next_point = calculate_next_point(prev_point, meter_offset, bearing)
+def find_points_inside_polygon(original_route_points, lats, lngs):
+    # intersects, so points on the boundary of the contour are kept
+    polygon = Polygon(np.column_stack((original_route_points.lngs, original_route_points.lats)))
+    shapely.prepare(polygon)
 
-    return next_point.lng
+    return shapely.intersects_xy(polygon, lngs, lats)
 
-def clear_points(original_route_points, generated_square_lattice_points):
-    logging.info("Clear points which do not lie inside the square lattice")
+def restore_square_lattice(meter_offset, square_lattice):
+    # The lattice is carried as rows of column indices of the points inside the contour, lattice_rows[i][j]
+    # is the j-th inside point of row i. All checks keep the positional semantics of these compacted rows.
+    logging.debug("Restore lattice")
 
-    polygon = Polygon([[route_point.lng, route_point.lat] for route_point in original_route_points])
-    generated_points = [Point(point.lng, point.lat) for point in generated_square_lattice_points]
-    final_lattice_points = list()
+    lattice_rows = get_lattice_rows(square_lattice)
+    end_row_idx, error = find_restored_rows_end(lattice_rows)
+    restored_lattice_rows = restore_lattice_rows(meter_offset, square_lattice, lattice_rows, 0, end_row_idx)
 
-    for generated_point in generated_points:
-        if polygon.intersects(generated_point):
-            point = Location(generated_point.x, generated_point.y)
-            final_lattice_points.append(point)            
+    if error is not None:
+        raise error
 
-    return final_lattice_points
+    return restored_lattice_rows
 
-def restore_square_lattice(meter_offset, size, cleared_points, final_lattice_points):
-    logging.info("Restore lattice")
+def find_restored_rows_end(lattice_rows):
+    # The restoration stops at the first row with one or zero points, the error is returned instead of raised,
+    # so that it comes after any error of the rows before it as in a single pass over the rows.
+    for i in range(len(lattice_rows)):
+        try:
+            if validate_has_elements_on_current_row(i, lattice_rows):
+                return i, None
+        except LatticeGenerationError as error:
+            return i, error
 
+    return len(lattice_rows), None
+
+def restore_lattice_rows(meter_offset, square_lattice, lattice_rows, start_row_idx, end_row_idx):
+    # each row only depends on itself, its neighbouring rows and the last row, so bands of rows can be restored separately
     max_offset = meter_offset + 0.5
-    restored_lattice_points = list()
-    current_lattice = convert_list_to_square_lattice(meter_offset, size, final_lattice_points, cleared_points)
+    restored_lattice_rows = list()
 
-    for i, current_row in enumerate(current_lattice):
+    for i in range(start_row_idx, end_row_idx):
+        current_row = lattice_rows[i]
         row = list()
 
-        if validate_has_elements_on_current_row(i, current_lattice):
-            break
-
-        for j, current_element in enumerate(current_row):
-            if has_start_points_issues(i, j, max_offset, current_lattice):
+        for j, column_idx in enumerate(current_row):
+            if has_start_points_issues(i, j, max_offset, square_lattice, lattice_rows):
                 continue
-            if has_end_points_issues(i, j, max_offset, current_lattice):
+            if has_end_points_issues(i, j, max_offset, square_lattice, lattice_rows):
                 break
-            row.append(current_element)
-        restored_lattice_points.append(row)
+            row.append(column_idx)
+        restored_lattice_rows.append(row)
 
-    return restored_lattice_points
+    return restored_lattice_rows
 
-def has_start_points_issues(i, j, max_offset, current_lattice):
-    current_row = current_lattice[i]
-    current_element = current_row[j]
+def has_start_points_issues(i, j, max_offset, square_lattice, lattice_rows):
+    current_row = lattice_rows[i]
+    current_point = (i, current_row[j])
 
     if j == len(current_row) - 1:
         return True
 
-    if i == len(current_lattice) - 1:
-        return (j == 0 and are_start_points_separated(current_element, current_row[j + 1], max_offset) 
-            and not should_add_first_point(i, i - 1, j, max_offset, current_lattice))
+    if i == len(lattice_rows) - 1:
+        return (j == 0 and are_points_separated(square_lattice, current_point, (i, current_row[j + 1]), max_offset)
+            and not should_add_first_point(i, i - 1, j, max_offset, square_lattice, lattice_rows))
 
-    return (j == 0 and are_start_points_separated(current_element, current_row[j + 1], max_offset) 
-        and not should_add_first_point(i, i + 1, j, max_offset, current_lattice)) or not should_add_point(i, j, max_offset, current_lattice, len(current_row))
+    return (j == 0 and are_points_separated(square_lattice, current_point, (i, current_row[j + 1]), max_offset)
+        and not should_add_first_point(i, i + 1, j, max_offset, square_lattice, lattice_rows)) or not should_add_point(i, j, max_offset, square_lattice, lattice_rows, len(current_row))
 
-def has_end_points_issues(i, j, max_offset, current_lattice):
-    current_row = current_lattice[i]
-    current_element = current_row[j]
+def has_end_points_issues(i, j, max_offset, square_lattice, lattice_rows):
+    current_row = lattice_rows[i]
+    current_point = (i, current_row[j])
 
-    if i == len(current_lattice) - 1:
+    if i == len(lattice_rows) - 1:
         return j == (len(current_row) - 1 
-                        and are_last_points_separated(current_element, current_row[j - 2], max_offset)
-                            and not should_add_last_point(i, i - 1, j, max_offset, current_lattice))
+                        and are_points_separated(square_lattice, current_point, (i, current_row[j - 2]), max_offset)
+                            and not should_add_last_point(i, i - 1, j, max_offset, square_lattice, lattice_rows))
             
     return (j == len(current_row) - 1
-                        and are_last_points_separated(current_element, current_row[j - 2], max_offset)
-                            and not should_add_last_point(i, i - 1, j - 1, max_offset, current_lattice))
+                        and are_points_separated(square_lattice, current_point, (i, current_row[j - 2]), max_offset)
+                            and not should_add_last_point(i, i - 1, j - 1, max_offset, square_lattice, lattice_rows))
 
-def convert_list_to_square_lattice(meter_offset, size, final_lattice_points, cleared_points):
-    logging.info('List to lattice conversion')
+def get_lattice_rows(square_lattice):
+    logging.debug('Lattice to rows conversion')
 
-    p = 0
-    current_lattice = list()
-    for _ in range(meter_offset, size, meter_offset):
-        row = list()
+    # the last generated column is not part of the restored lattice
+    rows_count = square_lattice.rows_count
+
+    return [np.flatnonzero(row_inside).tolist() for row_inside in square_lattice.inside[:, :rows_count]]
+
+def get_lattice_point(lattice_rows, row_idx, position):
+    # list indexing, so negative indices wrap around and missing points raise IndexError
+    column_idx = lattice_rows[row_idx][position]
 
-        q = 0
-        for _ in range(meter_offset, size, meter_offset):
-            current_point = final_lattice_points[p][q]
+    return row_idx % len(lattice_rows), column_idx
 
-            if (current_point in cleared_points):
-                row.append(current_point)
-            q += 1
+def find_lattice_distance(square_lattice, point, other_point):
+    row_idx, column_idx = point
+    other_row_idx, other_column_idx = other_point
 
-        p += 1
-        
-        current_lattice.append(row)
+    if row_idx == other_row_idx:
+        return abs(column_idx - other_column_idx) * square_lattice.column_spacings[row_idx]
 
-    return current_lattice
+    return find_distance(*square_lattice.get_point_coordinates(row_idx, column_idx),
+                            *square_lattice.get_point_coordinates(other_row_idx, other_column_idx))
 
-def should_add_point(row_idx, col_idx, max_offset, lattice, lat_size):
-    current_point = lattice[row_idx][col_idx]
+def should_add_point(row_idx, col_idx, max_offset, square_lattice, lattice_rows, lat_size):
+    current_point = get_lattice_point(lattice_rows, row_idx, col_idx)
 
     try:
         if col_idx == 0 or col_idx == lat_size:
-            upper_point = lattice[row_idx - 1][col_idx]
-            down_point = lattice[row_idx + 1][col_idx]
-            upper_distance = find_distance(current_point.lng, current_point.lat, upper_point.lng, upper_point.lat)
-            down_distance = find_distance(current_point.lng, current_point.lat, down_point.lng, down_point.lat)
+            upper_point = get_lattice_point(lattice_rows, row_idx - 1, col_idx)
+            down_point = get_lattice_point(lattice_rows, row_idx + 1, col_idx)
+            upper_distance = find_lattice_distance(square_lattice, current_point, upper_point)
+            down_distance = find_lattice_distance(square_lattice, current_point, down_point)
 
             return upper_distance < max_offset and down_distance < max_offset
         else:
@@ -233,70 +267,77 @@ def should_add_point(row_idx, col_idx, max_offset, lattice, lat_size):
     except IndexError:
         return True
 
-def should_add_first_point(curr_row_idx, row_idx, col_idx, max_offset, lattice):
-    if len(lattice[row_idx]) <= 1:
+def should_add_first_point(curr_row_idx, row_idx, col_idx, max_offset, square_lattice, lattice_rows):
+    if len(lattice_rows[row_idx]) <= 1:
         return True
 
-    point = lattice[row_idx][col_idx]
-    point_to_compare = lattice[curr_row_idx][col_idx]
-    distance = find_distance(point.lng, point.lat, point_to_compare.lng, point_to_compare.lat)
+    point = get_lattice_point(lattice_rows, row_idx, col_idx)
+    point_to_compare = get_lattice_point(lattice_rows, curr_row_idx, col_idx)
+    distance = find_lattice_distance(square_lattice, point, point_to_compare)
 
     if distance > max_offset:
         return False
 
-    return len(lattice[curr_row_idx]) < len(lattice[row_idx])
+    return len(lattice_rows[curr_row_idx]) < len(lattice_rows[row_idx])
 
-def are_start_points_separated(current_point, next_point, max_offset):
-    distance_between_points = find_distance(current_point.lng, current_point.lat, next_point.lng, next_point.lat)
+def are_points_separated(square_lattice, point, other_point, max_offset):
+    distance_between_points = find_lattice_distance(square_lattice, point, other_point)
 
     return distance_between_points > max_offset
 
-def are_last_points_separated(current_point, previous_point, max_offset):
-    distance_between_points = find_distance(previous_point.lng, previous_point.lat, current_point.lng, current_point.lat)
-
-    return distance_between_points > max_offset
-
-def should_add_last_point(curr_row_idx, prev_row_idx, col_idx, max_offset, lattice):
-    prev_point = lattice[prev_row_idx][len(lattice[prev_row_idx]) - 1]
-    point_to_compare = lattice[curr_row_idx][col_idx]
-    distance = find_distance(prev_point.lng, prev_point.lat, point_to_compare.lng, point_to_compare.lat)
+def should_add_last_point(curr_row_idx, prev_row_idx, col_idx, max_offset, square_lattice, lattice_rows):
+    prev_point = get_lattice_point(lattice_rows, prev_row_idx, len(lattice_rows[prev_row_idx]) - 1)
+    point_to_compare = get_lattice_point(lattice_rows, curr_row_idx, col_idx)
+    distance = find_lattice_distance(square_lattice, prev_point, point_to_compare)
 
     if distance < max_offset:
         return True
 
-    return len(lattice[curr_row_idx]) < len(lattice[prev_row_idx])
+    return len(lattice_rows[curr_row_idx]) < len(lattice_rows[prev_row_idx])
 
-def validate_lattice(offset, lattice):
+def validate_lattice(offset, square_lattice, lattice_rows):
     max_offset = offset+0.5
-    logging.info("Lattice validation")
+    logging.debug("Lattice validation")
 
-    final_points = list()
-    for i, current_row in enumerate(lattice):
+    row_lengths = np.array([len(row) for row in lattice_rows], dtype=np.int64)
+    row_starts = np.concatenate(([0], np.cumsum(row_lengths)))
+    row_indices = np.repeat(np.arange(len(lattice_rows)), row_lengths)
+    column_indices = np.fromiter(chain.from_iterable(lattice_rows), dtype=np.int64, count=int(row_starts[-1]))
+    lngs, lats = square_lattice.get_coordinates(row_indices, column_indices)
+    # distances[k] is the distance between the k-th and the (k + 1)-th point, the pairs spanning two rows are not used
+    distances = find_row_distances(lngs, lats)
+    within_max_offset = distances <= max_offset
+    final_points = np.zeros(len(column_indices), dtype=bool)
 
-        if validate_has_elements_on_current_row(i, lattice):
+    for i, current_row in enumerate(lattice_rows):
+
+        if validate_has_elements_on_current_row(i, lattice_rows):
             break
 
-        for j, current_point in enumerate(current_row[:-1]):
-            next_point = current_row[j + 1]
-            distance_between_points = find_distance(current_point.lng, current_point.lat, next_point.lng, next_point.lat)
+        if not current_row:
+            logging.debug("Row without points")
+
+            raise LatticeGenerationError(ErrorMessage.LATTICE_CANNOT_BE_GENERATED)
 
-            if  distance_between_points <= max_offset:
-                final_points.append(current_point)
-            else:
-                handle_distance_longer_than_max_offset(i, j, lattice, next_point, offset)
+        start = row_starts[i]
+        last = row_starts[i + 1] - 1
 
-        final_points.append(current_row[-1])
+        for j in np.flatnonzero(~within_max_offset[start:last]).tolist():
+            handle_distance_longer_than_max_offset(i, j, lattice_rows, distances[start:last], offset)
 
-    return final_points
+        final_points[start:last] = within_max_offset[start:last]
+        final_points[last] = True
 
-def handle_distance_longer_than_max_offset(i, j, lattice, next_point, max_offset):
-    if (j == 0 or j == len(lattice) - 2):
-        logging.info("The edge points are placed farther than the maximum offset.")
+    return TrackPoints(lngs[final_points], lats[final_points])
+
+def handle_distance_longer_than_max_offset(i, j, lattice_rows, row_distances, max_offset):
+    if (j == 0 or j == len(lattice_rows) - 2):
+        logging.debug("The edge points are placed farther than the maximum offset.")
 
         raise LatticeGenerationError(ErrorMessage.LATTICE_CANNOT_BE_GENERATED)
 
-    if not has_row_breaking(i, j + 2, max_offset, next_point, lattice):
-        logging.info("Row breaking.")
+    if not has_row_breaking(j + 1, max_offset, row_distances):
+        logging.debug("Row breaking.")
 
         raise LatticeGenerationError(ErrorMessage.LATTICE_CANNOT_BE_GENERATED)
 
@@ -304,7 +345,7 @@ def validate_has_elements_on_current_row(current_idx, lattice):
     is_not_first_or_last_row = (current_idx != 0 and current_idx != len(lattice) - 1)
 
     if len(lattice[current_idx]) <= 1 and is_not_first_or_last_row and has_insufficient_elements_to_the_end(current_idx, lattice):
-        logging.info("Row with one or zero points")
+        logging.debug("Row with one or zero points")
 
         raise LatticeGenerationError(ErrorMessage.LATTICE_CANNOT_BE_GENERATED)
 
@@ -316,13 +357,6 @@ def has_insufficient_elements_to_the_end(current_idx, lattice):
             return True
     return False
 
-def has_row_breaking(i, j, max_offset, next_point, lattice):
-    for k in range(j, len(lattice[i]), 1):
-        after_next_point = lattice[i][k]
-        distance = find_distance(next_point.lng, next_point.lat, after_next_point.lng, after_next_point.lat)
-
-        if distance <= max_offset:
-            return True
-
-        next_point = after_next_point
-    return False
\ No newline at end of file
+def has_row_breaking(j, max_offset, row_distances):
+    # the row continues if any pair of neighbours from the j-th point on is close enough
+    return bool(np.any(row_distances[j:] <= max_offset))
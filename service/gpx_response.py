@@ -0,0 +1,201 @@
+import queue
+import threading
+import time
+import unicodedata
+import zlib
+from urllib.parse import quote
+from flask import Response
+from config.settings import (RESPONSE_CACHE_MAX_ENTRY_SIZE_MB, RESPONSE_CHUNK_SIZE, RESPONSE_GZIP_ENABLED, RESPONSE_GZIP_LEVEL,
+                                RESPONSE_QUEUE_SIZE)
+from enumeration.mime_type import MimeType
+from enumeration.pipeline_stage import PipelineStage
+from service.instrumentation import stage_duration
+from service.request_profiling import profile_worker
+
+GZIP_ENCODING = 'gzip'
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+QUEUE_PUT_TIMEOUT = 1.0
+END_OF_STREAM = None
+BYTES_PER_MB = 1024 * 1024
+
+class ChunkWriter:
+    # File-like target for ElementTree.write, the written bytes are handed over in chunks through a bounded queue
+    def __init__(self, chunks, cancelled, chunk_size):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.wait_time = 0.0
+
+    def write(self, data):
+        self.buffer += data
+
+        if len(self.buffer) >= self.chunk_size:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+
+        return len(data)
+
+    def write_tree(self, tree):
+        try:
+            start = time.perf_counter()
+            tree.write(self)
+
+            if self.buffer:
+                self.put(bytes(self.buffer))
+
+            # the time spent waiting for a slow client is not part of the serialization
+            stage_duration.observe(time.perf_counter() - start - self.wait_time, (PipelineStage.SERIALIZE,))
+            self.put(END_OF_STREAM)
+        except StreamCancelledError:
+            pass
+        except Exception as error:
+            self.put(error)
+
+    def put(self, chunk):
+        start = time.perf_counter()
+
+        try:
+            while True:
+                if self.cancelled.is_set():
+                    raise StreamCancelledError()
+
+                try:
+                    self.chunks.put(chunk, timeout=QUEUE_PUT_TIMEOUT)
+
+                    return
+                except queue.Full:
+                    pass
+        finally:
+            self.wait_time += time.perf_counter() - start
+
+class StreamCancelledError(Exception):
+    pass
+
+def generate_tree_chunks(tree, chunk_size=RESPONSE_CHUNK_SIZE):
+    chunks = queue.Queue(maxsize=RESPONSE_QUEUE_SIZE)
+    cancelled = threading.Event()
+    chunk_writer = ChunkWriter(chunks, cancelled, chunk_size)
+    writer_thread = threading.Thread(target=profile_worker(chunk_writer.write_tree), args=(tree,), daemon=True)
+
+    writer_thread.start()
+
+    try:
+        while True:
+            chunk = chunks.get()
+
+            if chunk is END_OF_STREAM:
+                return
+
+            if isinstance(chunk, Exception):
+                raise chunk
+
+            yield chunk
+    finally:
+        cancelled.set()
+
+def generate_file_chunks(file, chunk_size=RESPONSE_CHUNK_SIZE):
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+
+            if not chunk:
+                return
+
+            yield chunk
+    finally:
+        file.close()
+
+def generate_gzip_chunks(chunks):
+    compressor = zlib.compressobj(RESPONSE_GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+
+    for chunk in chunks:
+        compressed_chunk = compressor.compress(chunk)
+
+        if compressed_chunk:
+            yield compressed_chunk
+
+    yield compressor.flush()
+
+def generate_stored_chunks(chunks, store_body, max_body_size):
+    # the body is handed over only when it was sent completely and is not larger than max_body_size
+    stored_chunks = list()
+    body_size = 0
+
+    for chunk in chunks:
+        if stored_chunks is not None:
+            body_size += len(chunk)
+
+            if body_size <= max_body_size:
+                stored_chunks.append(chunk)
+            else:
+                stored_chunks = None
+
+        yield chunk
+
+    if stored_chunks is not None:
+        store_body(b''.join(stored_chunks))
+
+def generate_released_chunks(chunks, release):
+    try:
+        yield from chunks
+    finally:
+        release()
+
+def generate_body_chunks(body, chunk_size=RESPONSE_CHUNK_SIZE):
+    for offset in range(0, len(body), chunk_size):
+        yield body[offset:offset + chunk_size]
+
+def send_gpx_tree(tree, download_name, accepts_gzip=False, store_body=None, release=None):
+    # release is called once the tree was written or the response was closed
+    chunks = generate_tree_chunks(tree)
+
+    if release is not None:
+        chunks = generate_released_chunks(chunks, release)
+
+    return send_gpx_chunks(chunks, download_name, accepts_gzip, store_body)
+
+def send_gpx_file(file, download_name, accepts_gzip=False, store_body=None):
+    return send_gpx_chunks(generate_file_chunks(file), download_name, accepts_gzip, store_body)
+
+def send_gpx_body(body, download_name, accepts_gzip=False):
+    return send_gpx_chunks(generate_body_chunks(body), download_name, accepts_gzip)
+
+def send_zip_file(file, download_name):
+    # zip entries are compressed already, so the response is never gzipped
+    response = Response(generate_file_chunks(file), mimetype=MimeType.ZIP, direct_passthrough=True)
+
+    set_attachment(response, download_name)
+
+    return response
+
+def send_gpx_chunks(chunks, download_name, accepts_gzip, store_body=None):
+    is_gzipped = accepts_gzip and RESPONSE_GZIP_ENABLED
+
+    if store_body is not None:
+        chunks = generate_stored_chunks(chunks, store_body, RESPONSE_CACHE_MAX_ENTRY_SIZE_MB * BYTES_PER_MB)
+
+    response = Response(generate_gzip_chunks(chunks) if is_gzipped else chunks, mimetype=MimeType.GPX_XML, direct_passthrough=True)
+
+    set_attachment(response, download_name)
+    response.vary.add('Accept-Encoding')
+
+    if is_gzipped:
+        response.content_encoding = GZIP_ENCODING
+
+    return response
+
+def set_attachment(response, download_name):
+    if not download_name:
+        response.headers.set('Content-Disposition', 'attachment')
+
+        return
+
+    try:
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        simple_name = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple_name, 'filename*': "UTF-8''" + quote(download_name, safe="!#$&+-.^_`|~")}
+
+    response.headers.set('Content-Disposition', 'attachment', **names)
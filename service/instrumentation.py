@@ -0,0 +1,290 @@
+import bisect
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from config.settings import LOG_SAMPLE_RATE, METRICS_DIRECTORY
+from enumeration.pipeline_stage import PipelineStage
+
+DURATION_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+POINTS_BUCKETS = [10, 100, 1000, 10000, 100000, 1000000, 10000000]
+LATTICE_STAGES = [PipelineStage.BOUNDING_BOX, PipelineStage.LATTICE, PipelineStage.CLEARING, PipelineStage.RESTORE,
+                    PipelineStage.VALIDATION]
+CACHE_STATISTICS = [
+    ('hits', 'counter', 'Cache hits'),
+    ('misses', 'counter', 'Cache misses'),
+    ('evictions', 'counter', 'Entries evicted from the cache'),
+    ('entries', 'gauge', 'Entries in the cache'),
+    ('size_mb', 'gauge', 'Size of the cached entries in megabytes')
+]
+METRICS_SNAPSHOT_INTERVAL = 1.0
+METRICS_SNAPSHOT_EXTENSION = '.json'
+
+# The metrics are kept by each process. With METRICS_DIRECTORY set, the processes write snapshots of them there
+# and /metrics sums the snapshots of all worker processes of the server.
+metrics = list()
+log_sample_counter = itertools.count()
+metrics_snapshots = {'file': None, 'get_cache_statistics': dict}
+
+class Counter:
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values = dict()
+        self.lock = threading.Lock()
+
+        metrics.append(self)
+
+    def increment(self, label_values=(), amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get_values(self):
+        with self.lock:
+            return dict(self.values)
+
+    def merge_values(self, value, other_value):
+        return value + other_value
+
+    def render(self, values):
+        lines = ['# HELP %s %s' % (self.name, self.description), '# TYPE %s counter' % self.name]
+
+        for label_values, value in sorted(values.items()):
+            lines.append('%s%s %s' % (self.name, format_labels(self.label_names, label_values), format_value(value)))
+
+        return lines
+
+class Histogram:
+    def __init__(self, name, description, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # label values -> counts of each bucket and above the last one, sum of the values
+        self.values = dict()
+        self.lock = threading.Lock()
+
+        metrics.append(self)
+
+    def observe(self, value, label_values=()):
+        bucket_idx = bisect.bisect_left(self.buckets, value)
+
+        with self.lock:
+            bucket_counts, value_sum = self.values.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            bucket_counts[bucket_idx] += 1
+            self.values[label_values] = (bucket_counts, value_sum + value)
+
+    def get_values(self):
+        with self.lock:
+            return {label_values: (list(bucket_counts), value_sum) for label_values, (bucket_counts, value_sum) in self.values.items()}
+
+    def merge_values(self, value, other_value):
+        return [count + other_count for count, other_count in zip(value[0], other_value[0])], value[1] + other_value[1]
+
+    def render(self, values):
+        lines = ['# HELP %s %s' % (self.name, self.description), '# TYPE %s histogram' % self.name]
+
+        for label_values, (bucket_counts, value_sum) in sorted(values.items()):
+            cumulative_counts = list(itertools.accumulate(bucket_counts))
+
+            for bucket, count in zip(self.buckets + ['+Inf'], cumulative_counts):
+                labels = format_labels(self.label_names + ('le',), label_values + (format_value(bucket),))
+                lines.append('%s_bucket%s %d' % (self.name, labels, count))
+
+            labels = format_labels(self.label_names, label_values)
+            lines.append('%s_sum%s %s' % (self.name, labels, format_value(value_sum)))
+            lines.append('%s_count%s %d' % (self.name, labels, cumulative_counts[-1]))
+
+        return lines
+
+class StageTimer:
+    # report_stage has the signature of the pipeline's stage reports, each stage lasts until the next one is reported.
+    # Only the listed stages are observed, the others just end the previous stage.
+    def __init__(self, stages=LATTICE_STAGES):
+        self.stages = stages
+        self.stage = None
+        self.stage_start_time = None
+
+    def report_stage(self, stage):
+        self.finish_stage()
+
+        if stage in self.stages:
+            self.stage = stage
+            self.stage_start_time = time.perf_counter()
+
+    def finish_stage(self):
+        if self.stage is not None:
+            stage_duration.observe(time.perf_counter() - self.stage_start_time, (self.stage,))
+            self.stage = None
+
+stage_duration = Histogram('elevation_service_stage_duration_seconds', 'Duration of the pipeline stages', ('stage',))
+dem_sampling_duration = Histogram('elevation_service_dem_sampling_duration_seconds', 'Duration of reading a DEM data source',
+                                    ('source',))
+dem_sampling_timeouts = Counter('elevation_service_dem_sampling_timeouts_total', 'DEM data sources which were not read in time',
+                                    ('source',))
+sampled_points = Histogram('elevation_service_sampled_points', 'Points sampled from the DEMs at once', buckets=POINTS_BUCKETS)
+lattice_points = Histogram('elevation_service_lattice_points', 'Points of the generated and of the validated square lattices',
+                            ('lattice',), POINTS_BUCKETS)
+admission_rejections = Counter('elevation_service_admission_rejections_total', 'Requests rejected by the admission control',
+                                ('cost_class', 'reason'))
+admission_wait_duration = Histogram('elevation_service_admission_wait_seconds', 'Time requests waited for a slot of their cost class',
+                                    ('cost_class',))
+requests_count = Counter('elevation_service_requests_total', 'Handled requests', ('endpoint', 'status'))
+request_duration = Histogram('elevation_service_request_duration_seconds', 'Time until the response of a request starts',
+                                ('endpoint',))
+
+@contextmanager
+def measure_stage(stage):
+    # failed stages are not observed
+    start = time.perf_counter()
+
+    yield
+
+    stage_duration.observe(time.perf_counter() - start, (stage,))
+
+def log_sampled_debug(message, *args):
+    # Messages of the hot paths, under load only every LOG_SAMPLE_RATE-th one is logged
+    if logging.getLogger().isEnabledFor(logging.DEBUG) and next(log_sample_counter) % LOG_SAMPLE_RATE == 0:
+        logging.debug(message, *args)
+
+def render_metrics(cache_statistics):
+    # cache_statistics maps the name of each cache to the statistics it reports
+    if METRICS_DIRECTORY:
+        write_metrics_snapshot(cache_statistics)
+        metric_values, cache_statistics = read_metrics_snapshots()
+    else:
+        metric_values = {metric.name: metric.get_values() for metric in metrics}
+
+    lines = list()
+
+    for metric in metrics:
+        lines.extend(metric.render(metric_values.get(metric.name, dict())))
+
+    for statistic, metric_type, description in CACHE_STATISTICS:
+        name = 'elevation_service_cache_%s%s' % (statistic, '_total' if metric_type == 'counter' else '')
+        lines.extend(['# HELP %s %s' % (name, description), '# TYPE %s %s' % (name, metric_type)])
+        lines.extend(
+            '%s%s %s' % (name, format_labels(('cache',), (cache,)), format_value(statistics[statistic]))
+            for cache, statistics in sorted(cache_statistics.items())
+        )
+
+    return '\n'.join(lines) + '\n'
+
+def register_cache_statistics(get_cache_statistics):
+    metrics_snapshots['get_cache_statistics'] = get_cache_statistics
+
+def start_metrics_snapshots():
+    # Runs in each worker after the fork. Every process writes to its own file, the name is not reused by a later process with the same pid.
+    if not METRICS_DIRECTORY:
+        return
+
+    os.makedirs(METRICS_DIRECTORY, exist_ok=True)
+    metrics_snapshots['file'] = os.path.join(METRICS_DIRECTORY, '%d-%s%s' % (os.getpid(), uuid.uuid4().hex[:8], METRICS_SNAPSHOT_EXTENSION))
+    threading.Thread(target=write_metrics_snapshots, daemon=True).start()
+
+def write_metrics_snapshots():
+    while True:
+        write_metrics_snapshot()
+        time.sleep(METRICS_SNAPSHOT_INTERVAL)
+
+def write_metrics_snapshot(cache_statistics=None):
+    # the snapshot replaces the previous one at once, so a reader never sees a process with smaller counters than before
+    snapshot_file = metrics_snapshots['file']
+
+    if snapshot_file is None:
+        return
+
+    if cache_statistics is None:
+        cache_statistics = metrics_snapshots['get_cache_statistics']()
+
+    snapshot = {
+        'pid': os.getpid(),
+        'metrics': {metric.name: [[list(label_values), value] for label_values, value in metric.get_values().items()] for metric in metrics},
+        'caches': cache_statistics
+    }
+
+    try:
+        file_descriptor, temporary_file = tempfile.mkstemp(dir=METRICS_DIRECTORY, suffix='.tmp')
+
+        with os.fdopen(file_descriptor, 'w') as file:
+            json.dump(snapshot, file)
+
+        os.replace(temporary_file, snapshot_file)
+    except OSError as error:
+        logging.warning("Cannot write metrics snapshot %s: %s", snapshot_file, error)
+
+def read_metrics_snapshots():
+    # The counters and histograms of exited workers stay in the sums, so the totals never go back when a worker is replaced.
+    # The cache gauges are summed over the running processes only.
+    metric_values = {metric.name: dict() for metric in metrics}
+    metrics_by_name = {metric.name: metric for metric in metrics}
+    cache_statistics = dict()
+
+    for snapshot in load_metrics_snapshots():
+        for name, values in snapshot['metrics'].items():
+            metric = metrics_by_name.get(name)
+
+            if metric is None:
+                continue
+
+            for label_values, value in values:
+                label_values = tuple(label_values)
+                previous_value = metric_values[name].get(label_values)
+                metric_values[name][label_values] = value if previous_value is None else metric.merge_values(previous_value, value)
+
+        is_alive = is_process_alive(snapshot['pid'])
+
+        for cache, statistics in snapshot['caches'].items():
+            merged_statistics = cache_statistics.setdefault(cache, {statistic: 0 for statistic, _, _ in CACHE_STATISTICS})
+
+            for statistic, metric_type, _ in CACHE_STATISTICS:
+                if metric_type == 'counter' or is_alive:
+                    merged_statistics[statistic] += statistics[statistic]
+
+    return metric_values, cache_statistics
+
+def load_metrics_snapshots():
+    try:
+        file_names = [file_name for file_name in os.listdir(METRICS_DIRECTORY) if file_name.endswith(METRICS_SNAPSHOT_EXTENSION)]
+    except OSError:
+        return
+
+    for file_name in file_names:
+        try:
+            with open(os.path.join(METRICS_DIRECTORY, file_name)) as file:
+                yield json.load(file)
+        except (OSError, ValueError):
+            continue
+
+def clear_metrics_snapshots():
+    # Runs in the master process when the server starts, the totals start from zero as they do with a single process
+    if METRICS_DIRECTORY:
+        shutil.rmtree(METRICS_DIRECTORY, ignore_errors=True)
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+def format_labels(label_names, label_values):
+    if not label_names:
+        return ''
+
+    labels = ('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in zip(label_names, label_values))
+
+    return '{%s}' % ','.join(labels)
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
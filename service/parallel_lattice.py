@@ -0,0 +1,102 @@
+import logging
+import multiprocessing
+import multiprocessing.util
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+import numpy as np
+from config.settings import LATTICE_MIN_BAND_ROWS, LATTICE_WORKERS
+from enumeration.job_stage import JobStage
+from service.geo import (calculate_lattice_size, find_points_inside_polygon, find_restored_rows_end, generate_square_lattice,
+                            get_bounding_box, restore_lattice_rows, validate_lattice)
+
+lattice_executor = None
+lattice_executor_lock = threading.Lock()
+
+def get_lattice_executor():
+    global lattice_executor
+
+    with lattice_executor_lock:
+        if lattice_executor is None:
+            lattice_executor = ProcessPoolExecutor(max_workers=LATTICE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            # inside a job process the pool has to be shut down before multiprocessing closes its queues and joins the children at exit
+            multiprocessing.util.Finalize(None, shutdown_lattice_executor, exitpriority=100)
+
+        return lattice_executor
+
+def shutdown_lattice_executor():
+    global lattice_executor
+
+    with lattice_executor_lock:
+        if lattice_executor is not None:
+            lattice_executor.shutdown()
+            lattice_executor = None
+
+def generate_square_lattice_in_bands(track_points, offset, report_stage):
+    # The coordinates of the points and their clearing are calculated for bands of rows on the worker processes.
+    # The bands are merged in order before the restoration, which looks at the rows next to each band,
+    # so the result and the raised errors are the same as in the sequential pipeline.
+    report_stage(JobStage.BOUNDING_BOX)
+    bounding_box = get_bounding_box(track_points)
+    lattice_size = int(calculate_lattice_size(bounding_box))
+
+    report_stage(JobStage.LATTICE)
+    square_lattice = generate_square_lattice(offset, lattice_size, bounding_box)
+    bands = split_into_bands(square_lattice.rows_count)
+
+    logging.debug("Lattice of %d rows in %d bands", square_lattice.rows_count, len(bands))
+
+    report_stage(JobStage.CLEARING)
+    band_lattice_rows = map_bands(find_band_lattice_rows, len(bands), repeat(square_lattice), repeat(track_points), *zip(*bands))
+    lattice_rows = list(chain.from_iterable(band_lattice_rows))
+
+    report_stage(JobStage.RESTORE)
+    end_row_idx, error = find_restored_rows_end(lattice_rows)
+    restore_bands = split_into_bands(end_row_idx)
+    rows_bands = [lattice_rows] if len(restore_bands) <= 1 else [
+        get_lattice_rows_band(lattice_rows, start_row_idx, end_row_idx) for start_row_idx, end_row_idx in restore_bands
+    ]
+    band_restored_rows = map_bands(restore_lattice_rows, len(restore_bands), repeat(offset), repeat(square_lattice), rows_bands, *zip(*restore_bands))
+    restored_lattice_rows = list(chain.from_iterable(band_restored_rows))
+
+    if error is not None:
+        raise error
+
+    report_stage(JobStage.VALIDATION)
+
+    return validate_lattice(float(offset), square_lattice, restored_lattice_rows)
+
+def find_band_lattice_rows(square_lattice, route_points, start_row_idx, end_row_idx):
+    # the last generated column is not part of the restored lattice
+    lats, lngs = square_lattice.get_band_coordinates(start_row_idx, end_row_idx)
+    rows_count = square_lattice.rows_count
+    inside = find_points_inside_polygon(route_points, lats[:, :rows_count], lngs[:, :rows_count])
+
+    return [np.flatnonzero(row_inside).tolist() for row_inside in inside]
+
+def get_lattice_rows_band(lattice_rows, start_row_idx, end_row_idx):
+    # A row is restored together with the rows above and below it, the first row also looks at the last one.
+    # The other rows are None, so the band is indexed like all rows and a missing row cannot pass unnoticed.
+    rows_count = len(lattice_rows)
+    rows_band = [None] * rows_count
+
+    for row_idx in range(max(start_row_idx - 1, 0), min(end_row_idx + 1, rows_count)):
+        rows_band[row_idx] = lattice_rows[row_idx]
+
+    if start_row_idx == 0 and rows_count:
+        rows_band[-1] = lattice_rows[-1]
+
+    return rows_band
+
+def map_bands(function, bands_count, *iterables):
+    # a single band is not worth sending to a worker process
+    if bands_count <= 1:
+        return map(function, *iterables)
+
+    return get_lattice_executor().map(function, *iterables)
+
+def split_into_bands(rows_count, workers=LATTICE_WORKERS, min_band_rows=LATTICE_MIN_BAND_ROWS):
+    bands_count = max(1, min(workers, rows_count // max(min_band_rows, 1)))
+    bounds = np.linspace(0, rows_count, bands_count + 1).astype(np.int64).tolist()
+
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
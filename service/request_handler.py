@@ -1,27 +1,44 @@
-from io import BytesIO
+import os
+import tempfile
 import xml.etree.ElementTree as ET
-from flask import send_file
-from dem.dem_reader import extract_elevations_from_dem
-from domain.location import Location
+from contextlib import ExitStack
+from config.settings import ELEVATION_SERVING_MODE, GPX_STREAMING_CHUNK_SIZE, GPX_STREAMING_MIN_SIZE, LATTICE_PIPELINE_MODE
+from dem.dem_reader import extract_elevations_from_dem, get_no_data_value
 from enumeration.dem_data_source import DEMDataSource
-#from enumeration.dem_file_name import DemFileName
 from enumeration.error_message import ErrorMessage
-from enumeration.mime_type import MimeType
+from enumeration.job_stage import JobStage
+from enumeration.pipeline_mode import PipelineMode
+from enumeration.pipeline_stage import PipelineStage
+from enumeration.serving_mode import ServingMode
 from exception.request_error import RequestError
 from gpx.gpx_read import extract_elevation, extract_track_points
+from gpx.gpx_stream import rewrite_track_point_elevations
 from gpx.gpx_write import add_elevation_element, add_track_points, replace_existing_elevations
-from service.approximation import calculate_approximated_elevations
+from service.admission_control import admit_without_limit, estimate_closed_contour_cost, hold_closed_contour_admission
+from service.approximation import calculate_approximated_elevations, fill_missing_elevations
+from service.coordinate_batch import parse_coordinates, send_elevations
+from service.dem_sampling import sample_dem_data_sources
+from service.gpx_response import send_gpx_file, send_gpx_tree
+from service.instrumentation import StageTimer, lattice_points, measure_stage, sampled_points
+from service.parallel_lattice import generate_square_lattice_in_bands
 from service.geo import calculate_lattice_size, clear_points, generate_square_lattice, get_bounding_box, restore_square_lattice, validate_lattice
 
 GPX_NAMESPACE = "http://www.topografix.com/GPX/1/1"
 
-def handle_linear_route_request(received_gpx_file):
+def ignore_stage(stage):
+    pass
+
+def handle_linear_route_request(received_gpx_file, accepts_gzip=False, store_body=None):
     ET.register_namespace('', GPX_NAMESPACE)
 
     validate_gpx_file(received_gpx_file)
 
+    if get_file_size(received_gpx_file) >= GPX_STREAMING_MIN_SIZE:
+        return handle_streamed_linear_route_request(received_gpx_file, accepts_gzip, store_body)
+
     try:
-        tree = ET.parse(received_gpx_file)
+        with measure_stage(PipelineStage.PARSE):
+            tree = ET.parse(received_gpx_file)
     except ET.ParseError:
         raise RequestError(ErrorMessage.INVALID_GPX)
 
@@ -33,59 +50,108 @@ def handle_linear_route_request(received_gpx_file):
         raise RequestError(ErrorMessage.TRACK_POINTS_NOT_FOUND)
 
     approximated_elevations = get_approximated_elevations(track_points)
+    track_points = track_points.with_elevations(approximated_elevations)
 
     if not elevations:
-        add_elevation_element(root, approximated_elevations)
+        add_elevation_element(root, track_points)
     else:
-        replace_existing_elevations(root, approximated_elevations)
+        replace_existing_elevations(root, track_points)
+
+    return send_gpx_tree(tree, received_gpx_file.filename, accepts_gzip, store_body)
+
+def handle_streamed_linear_route_request(received_gpx_file, accepts_gzip=False, store_body=None):
+    updated_gpx_file = tempfile.TemporaryFile()
+
+    try:
+        track_points_count = rewrite_track_point_elevations(received_gpx_file, updated_gpx_file, get_approximated_elevations, GPX_STREAMING_CHUNK_SIZE)
+    except ET.ParseError:
+        updated_gpx_file.close()
+
+        raise RequestError(ErrorMessage.INVALID_GPX)
+    except:
+        updated_gpx_file.close()
+
+        raise
+
+    if not track_points_count:
+        updated_gpx_file.close()
+
+        raise RequestError(ErrorMessage.TRACK_POINTS_NOT_FOUND)
+
+    updated_gpx_file.seek(0)
+
+    return send_gpx_file(updated_gpx_file, received_gpx_file.filename, accepts_gzip, store_body)
 
-    received_gpx_file.seek(0)
-    received_gpx_file.truncate(0)
-    tree.write(received_gpx_file)
-    received_gpx_file.seek(0)
-    updated_gpx_file_content = received_gpx_file.read()
+def handle_coordinates_request(body, mimetype):
+    track_points = parse_coordinates(body, mimetype)
+    approximated_elevations = get_approximated_elevations(track_points)
 
-    return send_file(BytesIO(updated_gpx_file_content), mimetype=MimeType.GPX_XML, as_attachment=True, download_name=received_gpx_file.filename)
+    return send_elevations(approximated_elevations, mimetype)
 
-def handle_closed_contour_route_request(received_gpx_file, received_offset):
+def handle_closed_contour_route_request(received_gpx_file, received_offset, accepts_gzip=False, store_body=None):
     ET.register_namespace('', GPX_NAMESPACE)        
 
     validate_closed_contour_parts(received_gpx_file, received_offset)
 
     try:
-        tree = ET.parse(received_gpx_file)
+        with measure_stage(PipelineStage.PARSE):
+            tree = ET.parse(received_gpx_file)
     except ET.ParseError:
         raise RequestError(ErrorMessage.INVALID_GPX)
 
-    root = tree.getroot()
+    # the tree with the lattice points lives until the streamed body was written, so the admission slot is held until then
+    admission = ExitStack()
+
+    try:
+        add_square_lattice_points(tree.getroot(), get_offset(received_offset), StageTimer().report_stage,
+                                    lambda cost_estimate: hold_closed_contour_admission(admission, cost_estimate))
+
+        return send_gpx_tree(tree, received_gpx_file.filename, accepts_gzip, store_body, admission.close)
+    except:
+        admission.close()
+
+        raise
+
+def add_square_lattice_points(root, offset, report_stage=ignore_stage, admit=admit_without_limit):
+    # admit is entered with the cost estimate before the lattice is generated and may wait for or refuse the request
     track_points = extract_track_points(root)
 
     if len(track_points) < 3:
         raise RequestError(ErrorMessage.MIN_POINTS_REQUIRED)
 
-    offset = get_offset(received_offset)
-    square_lattice = handle_square_lattice_generation(track_points, offset)
-    approximated_elevations = get_approximated_elevations(square_lattice)
+    with admit(estimate_closed_contour_cost(track_points, offset)):
+        # only the lattice is generated on the worker processes, the sampling stays in this process with its DEM handles,
+        # pixel cache and metrics
+        if LATTICE_PIPELINE_MODE == PipelineMode.PARALLEL:
+            square_lattice_points = generate_square_lattice_in_bands(track_points, offset, report_stage)
+        else:
+            square_lattice_points = handle_square_lattice_generation(track_points, offset, report_stage)
 
-    add_track_points(root, approximated_elevations, square_lattice)
+        report_stage(JobStage.SAMPLING)
+        approximated_elevations = get_approximated_elevations(square_lattice_points)
 
-    received_gpx_file.seek(0)
-    received_gpx_file.truncate(0)
-    tree.write(received_gpx_file)
-    received_gpx_file.seek(0)
-    updated_gpx_file_content = received_gpx_file.read()
+        lattice_points.observe(len(square_lattice_points), ('validated',))
 
-    return send_file(BytesIO(updated_gpx_file_content), mimetype=MimeType.GPX_XML, as_attachment=True, download_name=received_gpx_file.filename)
+        report_stage(JobStage.WRITE)
+        add_track_points(root, square_lattice_points.with_elevations(approximated_elevations))
 
-def handle_square_lattice_generation(track_points, offset):
+def handle_square_lattice_generation(track_points, offset, report_stage=ignore_stage):
+    report_stage(JobStage.BOUNDING_BOX)
     bounding_box = get_bounding_box(track_points)
     lattice_size = int(calculate_lattice_size(bounding_box))
-    lattice = generate_square_lattice(offset, lattice_size, bounding_box)
-    lattice_as_list = [Location(element.lng, element.lat) for row in lattice for element in row]
-    cleared_points = clear_points(track_points, lattice_as_list)
-    restored_lattice = restore_square_lattice(offset, lattice_size, cleared_points, lattice)
 
-    return validate_lattice(float(offset), restored_lattice)
+    report_stage(JobStage.LATTICE)
+    square_lattice = generate_square_lattice(offset, lattice_size, bounding_box)
+
+    report_stage(JobStage.CLEARING)
+    clear_points(track_points, square_lattice)
+
+    report_stage(JobStage.RESTORE)
+    restored_lattice_rows = restore_square_lattice(offset, square_lattice)
+
+    report_stage(JobStage.VALIDATION)
+
+    return validate_lattice(float(offset), square_lattice, restored_lattice_rows)
 
 def get_offset(received_offset):
     min_offset = 5
@@ -98,12 +164,18 @@ def get_offset(received_offset):
     return offset
 
 def get_approximated_elevations(track_points):
-    elevations_jaxa = [] #extract_elevations_from_dem(DemFileName.ALOS_WORLD, track_points)
-    elevations_srtm_90_m = [] #extract_elevations_from_dem(DemFileName.SRTM_90_M, track_points)
-    elevations_srtm_30_m = [] #extract_elevations_from_dem(DemFileName.SRTM_30_M, track_points)
-    elevations = {DEMDataSource.SRTM_30_M: elevations_srtm_30_m, DEMDataSource.SRTM_90_M: elevations_srtm_90_m, DEMDataSource.ALOS_WORLD_3D_30_M: elevations_jaxa}
+    sampled_points.observe(len(track_points))
+
+    if ELEVATION_SERVING_MODE == ServingMode.FUSED:
+        with measure_stage(PipelineStage.SAMPLING):
+            return fill_missing_elevations(extract_elevations_from_dem(DEMDataSource.FUSED, track_points))
 
-    return calculate_approximated_elevations(elevations, track_points)
+    with measure_stage(PipelineStage.SAMPLING):
+        elevations, _ = sample_dem_data_sources(track_points)
+        no_data_values = {dem_data_source: get_no_data_value(dem_data_source) for dem_data_source in elevations}
+
+    with measure_stage(PipelineStage.FUSION):
+        return calculate_approximated_elevations(elevations, track_points, no_data_values)
 
 def validate_closed_contour_parts(gpx_file, extracted_offset):
     if gpx_file is None and extracted_offset is None:
@@ -117,6 +189,13 @@ def validate_closed_contour_parts(gpx_file, extracted_offset):
 
     validate_gpx_file(gpx_file)
 
+def get_file_size(gpx_file):
+    gpx_file.stream.seek(0, os.SEEK_END)
+    size = gpx_file.stream.tell()
+    gpx_file.stream.seek(0)
+
+    return size
+
 def validate_gpx_file(gpx_file):
     if gpx_file is None:
         raise RequestError(ErrorMessage.GPX_FILE_NOT_SET)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import cProfile
+import functools
+import hmac
+import logging
+import os
+import pstats
+import re
+import threading
+import uuid
+from flask import request
+from config.settings import PROFILING_DIRECTORY, PROFILING_HEADER, PROFILING_TOKENS, PROFILING_TOP_FUNCTIONS
+
+REQUEST_ID_HEADER = 'X-Request-Id'
+PROFILE_TOTAL_HEADER = 'X-Profile-Total'
+PROFILE_TOP_HEADER = 'X-Profile-Top'
+REQUEST_ID_PATTERN = re.compile('[A-Za-z0-9_-]{1,64}')
+PROFILE_FILE_EXTENSION = '.prof'
+
+# the profile of the request which the thread is running, worker threads get it through profile_worker
+profiling_state = threading.local()
+
+if PROFILING_DIRECTORY:
+    os.makedirs(PROFILING_DIRECTORY, exist_ok=True)
+
+class RequestProfile:
+    # The profiles of a request and of the worker threads it used. The profile file is written each time
+    # the request and all of its started workers are finished, so a writer thread ending after the request is included.
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.profiles = list()
+        self.running_count = 1
+        self.lock = threading.Lock()
+
+    def start_worker(self):
+        with self.lock:
+            self.running_count += 1
+
+    def finish(self, profile=None):
+        with self.lock:
+            if profile is not None:
+                self.profiles.append(profile)
+
+            self.running_count -= 1
+            is_finished = self.running_count == 0
+            profiles = list(self.profiles)
+
+        if is_finished and PROFILING_DIRECTORY and profiles:
+            pstats.Stats(*profiles).dump_stats(os.path.join(PROFILING_DIRECTORY, self.request_id + PROFILE_FILE_EXTENSION))
+            logging.info("Wrote profile of request %s", self.request_id)
+
+    def get_stats(self):
+        with self.lock:
+            return pstats.Stats(*self.profiles) if self.profiles else None
+
+def profile_request(view):
+    # Without PROFILING_TOKENS the view is left as it is, so profiling costs nothing unless it is configured.
+    # Otherwise a request with one of the tokens in PROFILING_HEADER is run under cProfile.
+    if not PROFILING_TOKENS:
+        return view
+
+    @functools.wraps(view)
+    def profiled_view(*args, **kwargs):
+        if not is_profiling_requested():
+            return view(*args, **kwargs)
+
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError:
+            logging.warning("Cannot profile request, another profiler is active")
+
+            return view(*args, **kwargs)
+
+        request_profile = RequestProfile(get_request_id())
+        profiling_state.request_profile = request_profile
+
+        try:
+            response = view(*args, **kwargs)
+        finally:
+            profile.disable()
+            profiling_state.request_profile = None
+
+        request_profile.profiles.append(profile)
+        add_profile(response, request_profile)
+
+        if response.direct_passthrough:
+            # a streamed body is written on a worker thread which is started while the response is sent
+            response.response = generate_profiled_chunks(response.response, request_profile)
+        else:
+            request_profile.finish()
+
+        return response
+
+    return profiled_view
+
+def profile_worker(function):
+    # Binds function to the profile of the request running on this thread, it is profiled on the thread which runs it.
+    # Without a profiled request function is returned as it is.
+    request_profile = getattr(profiling_state, 'request_profile', None)
+
+    if request_profile is None:
+        return function
+
+    @functools.wraps(function)
+    def profiled_function(*args, **kwargs):
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError:
+            return function(*args, **kwargs)
+
+        request_profile.start_worker()
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            request_profile.finish(profile)
+
+    return profiled_function
+
+def generate_profiled_chunks(chunks, request_profile):
+    profiling_state.request_profile = request_profile
+
+    try:
+        yield from chunks
+    finally:
+        profiling_state.request_profile = None
+        request_profile.finish()
+
+def is_profiling_requested():
+    if not PROFILING_TOKENS:
+        return False
+
+    token = request.headers.get(PROFILING_HEADER, '')
+
+    return bool(token) and any(hmac.compare_digest(token.encode(), allowed_token.encode()) for allowed_token in PROFILING_TOKENS)
+
+def add_profile(response, request_profile):
+    # The summary lists the functions with the most own time on the request and the sampling threads. The writer thread
+    # of a streamed body runs after the headers are sent, it is only part of the profile file.
+    stats = request_profile.get_stats()
+
+    response.headers[REQUEST_ID_HEADER] = request_profile.request_id
+    response.headers[PROFILE_TOTAL_HEADER] = '%.4f' % stats.total_tt
+    response.headers[PROFILE_TOP_HEADER] = get_top_functions(stats, PROFILING_TOP_FUNCTIONS)
+
+def get_request_id():
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+
+    return request_id if REQUEST_ID_PATTERN.fullmatch(request_id) else uuid.uuid4().hex
+
+def get_top_functions(stats, count):
+    entries = sorted(stats.stats.items(), key=lambda entry: entry[1][2], reverse=True)[:count]
+    top_functions = '; '.join('%.4f %s:%d(%s)' % (own_time, os.path.basename(file_name), line, function_name)
+                                for (file_name, line, function_name), (_, _, own_time, _, _) in entries)
+
+    # header values have to be latin-1
+    return top_functions.encode('ascii', 'replace').decode('ascii')
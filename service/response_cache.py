@@ -0,0 +1,254 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from config.settings import (ELEVATION_SERVING_MODE, FUSION_WEIGHTS, RESPONSE_CACHE_DIRECTORY,
+                                RESPONSE_CACHE_DISK_SIZE_MB, RESPONSE_CACHE_MAX_ENTRY_SIZE_MB, RESPONSE_CACHE_MEMORY_SIZE_MB,
+                                RESPONSE_CACHE_TTL)
+from dem.dem_reader import get_dem, get_served_dem_data_sources
+
+BYTES_PER_MB = 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+CACHED_FILE_EXTENSION = '.gpx'
+TEMPORARY_FILE_EXTENSION = '.tmp'
+# a temporary file this old was left by a write which was interrupted, e.g. by a killed worker
+STALE_TEMPORARY_FILE_AGE = 600
+# the directory is scanned again after DISK_SCAN_INTERVAL seconds or after a process wrote
+# DISK_SCAN_WRITTEN_FRACTION of the disk size, so all workers together exceed it by a few fractions at most
+DISK_SCAN_INTERVAL = 60.0
+DISK_SCAN_WRITTEN_FRACTION = 0.1
+
+class ResponseCache:
+    # Whole GPX response bodies by content key. The memory tier is an LRU, the optional disk tier
+    # keeps the entries which do not fit in memory and survives restarts. The disk tier is shared by the workers,
+    # its size and TTL are enforced on the directory itself by the scans which follow the puts.
+    def __init__(self, memory_size_mb=RESPONSE_CACHE_MEMORY_SIZE_MB, directory=RESPONSE_CACHE_DIRECTORY,
+                    disk_size_mb=RESPONSE_CACHE_DISK_SIZE_MB, ttl=RESPONSE_CACHE_TTL,
+                    max_entry_size_mb=RESPONSE_CACHE_MAX_ENTRY_SIZE_MB):
+        self.memory_size = int(memory_size_mb * BYTES_PER_MB)
+        self.directory = directory
+        self.disk_size = int(disk_size_mb * BYTES_PER_MB)
+        self.ttl = ttl
+        self.max_entry_size = int(max_entry_size_mb * BYTES_PER_MB)
+        self.entries = OrderedDict()
+        self.entries_size = 0
+        self.last_disk_scan_time = 0.0
+        self.written_since_disk_scan = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self.scan_disk()
+            self.last_disk_scan_time = time.monotonic()
+
+    def is_enabled(self):
+        return self.max_entry_size > 0 and (self.memory_size > 0 or bool(self.directory))
+
+    def get(self, key):
+        body = self.get_from_memory(key)
+
+        if body is None and self.directory:
+            body = self.get_from_disk(key)
+
+            if body is not None:
+                self.put_in_memory(key, body)
+
+        with self.lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return body
+
+    def put(self, key, body):
+        if len(body) > self.max_entry_size:
+            return
+
+        self.put_in_memory(key, body)
+
+        if self.directory:
+            self.put_on_disk(key, body)
+
+    def get_from_memory(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return None
+
+            body, expiration_time = entry
+
+            if expiration_time < time.monotonic():
+                self.remove_from_memory(key)
+
+                return None
+
+            self.entries.move_to_end(key)
+
+            return body
+
+    def put_in_memory(self, key, body):
+        if len(body) > self.memory_size:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.remove_from_memory(key)
+
+            self.entries[key] = (body, time.monotonic() + self.ttl)
+            self.entries_size += len(body)
+
+            while self.entries_size > self.memory_size:
+                self.remove_from_memory(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove_from_memory(self, key):
+        body, _ = self.entries.pop(key)
+        self.entries_size -= len(body)
+
+    def scan_disk(self):
+        # The oldest files are removed until the directory fits in the disk size, the modification time is the last use.
+        # Expired entries and temporary files left by interrupted writes are removed too.
+        cached_files = list()
+        disk_usage = 0
+        now = time.time()
+
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+
+            if entry.name.endswith(TEMPORARY_FILE_EXTENSION):
+                if now - stat.st_mtime > STALE_TEMPORARY_FILE_AGE:
+                    remove_cached_file(entry.path)
+            elif entry.name.endswith(CACHED_FILE_EXTENSION):
+                if now - stat.st_mtime > self.ttl:
+                    remove_cached_file(entry.path)
+                else:
+                    cached_files.append((stat.st_mtime, stat.st_size, entry.path))
+                    disk_usage += stat.st_size
+
+        evictions = 0
+
+        for _, size, path in sorted(cached_files):
+            if disk_usage <= self.disk_size:
+                break
+
+            remove_cached_file(path)
+            disk_usage -= size
+            evictions += 1
+
+        with self.lock:
+            self.evictions += evictions
+
+        logging.debug("Disk tier %s holds %d bytes after %d evictions", self.directory, disk_usage, evictions)
+
+    def get_from_disk(self, key):
+        cached_file = self.get_cached_file(key)
+
+        try:
+            if time.time() - os.path.getmtime(cached_file) > self.ttl:
+                os.remove(cached_file)
+
+                return None
+
+            with open(cached_file, 'rb') as file:
+                body = file.read()
+
+            # the modification time is the last use of the entry for the eviction
+            os.utime(cached_file)
+
+            return body
+        except OSError:
+            return None
+
+    def put_on_disk(self, key, body):
+        if len(body) > self.disk_size:
+            return
+
+        try:
+            file_descriptor, temporary_file = tempfile.mkstemp(dir=self.directory, suffix=TEMPORARY_FILE_EXTENSION)
+
+            with os.fdopen(file_descriptor, 'wb') as file:
+                file.write(body)
+
+            os.replace(temporary_file, self.get_cached_file(key))
+        except OSError as error:
+            logging.warning("Cannot write cached response %s: %s", key, error)
+
+            return
+
+        if self.is_disk_scan_due(len(body)):
+            try:
+                self.scan_disk()
+            except OSError as error:
+                logging.warning("Cannot scan response cache directory %s: %s", self.directory, error)
+
+    def is_disk_scan_due(self, written_size):
+        now = time.monotonic()
+
+        with self.lock:
+            self.written_since_disk_scan += written_size
+
+            if (now - self.last_disk_scan_time < DISK_SCAN_INTERVAL
+                    and self.written_since_disk_scan < self.disk_size * DISK_SCAN_WRITTEN_FRACTION):
+                return False
+
+            self.last_disk_scan_time = now
+            self.written_since_disk_scan = 0
+
+            return True
+
+    def get_cached_file(self, key):
+        return os.path.join(self.directory, key + CACHED_FILE_EXTENSION)
+
+    def get_statistics(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'size_mb': self.entries_size / BYTES_PER_MB
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.entries_size = 0
+
+def remove_cached_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def create_cache_key(endpoint, gpx_file, offset=None):
+    # The response keeps everything in the uploaded file, so the whole upload is hashed together with
+    # the parameters and the DEMs which decide the elevations.
+    key_hash = hashlib.sha256()
+
+    for part in [endpoint, str(offset), ELEVATION_SERVING_MODE, repr(sorted(FUSION_WEIGHTS.items()))] + get_dem_versions():
+        key_hash.update(part.encode() + b'\0')
+
+    gpx_file.stream.seek(0)
+
+    for block in iter(lambda: gpx_file.stream.read(HASH_BLOCK_SIZE), b''):
+        key_hash.update(block)
+
+    gpx_file.stream.seek(0)
+
+    return key_hash.hexdigest()
+
+def get_dem_versions():
+    return [dem_data_source + ':' + repr(get_dem(dem_data_source).modification_time) for dem_data_source in get_served_dem_data_sources()]
+
+response_cache = ResponseCache()
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+import numpy as np
+from config.settings import BATCH_MAX_FILES, BATCH_MAX_SIZE_MB
+from domain.track_points import TrackPoints
+from enumeration.error_message import ErrorMessage
+from exception.request_error import RequestError
+from gpx.gpx_read import extract_elevation, extract_track_points
+from gpx.gpx_write import add_elevation_element, replace_existing_elevations
+from service.gpx_response import send_zip_file
+from service.request_handler import GPX_NAMESPACE, get_approximated_elevations
+
+BYTES_PER_MB = 1024 * 1024
+BATCH_DOWNLOAD_NAME = 'batch.zip'
+BATCH_MANIFEST_NAME = 'batch.json'
+ARCHIVE_METADATA_DIRECTORY = '__MACOSX/'
+
+class BatchRoute:
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.entry_name = None
+        self.tree = None
+        self.track_points = None
+        self.has_elevations = False
+        self.error = None
+
+    def to_manifest_entry(self):
+        if self.error is not None:
+            return {'file_name': self.file_name, 'error': self.error}
+
+        return {'file_name': self.file_name, 'entry_name': self.entry_name, 'track_points': len(self.track_points)}
+
+def handle_linear_route_batch_request(received_gpx_files, received_gpx_archive):
+    # The track points of all files are sampled together, each distinct coordinate once.
+    # A file which cannot be processed is reported in the manifest of the response instead of failing the batch.
+    ET.register_namespace('', GPX_NAMESPACE)
+
+    batch_files = list(read_received_files(received_gpx_files))
+
+    if received_gpx_archive is not None:
+        batch_files.extend(read_archive_files(received_gpx_archive))
+
+    if not batch_files:
+        raise RequestError(ErrorMessage.GPX_FILE_NOT_SET)
+
+    if len(batch_files) > BATCH_MAX_FILES:
+        raise RequestError(ErrorMessage.BATCH_TOO_LARGE)
+
+    routes = [read_batch_route(file_name, content) for file_name, content in batch_files]
+    valid_routes = [route for route in routes if route.error is None]
+
+    logging.debug("Batch of %d files, %d valid", len(routes), len(valid_routes))
+
+    if valid_routes:
+        add_approximated_elevations(valid_routes)
+
+    return send_zip_file(write_batch_archive(routes), BATCH_DOWNLOAD_NAME)
+
+def read_received_files(received_gpx_files):
+    total_size = 0
+
+    for received_gpx_file in received_gpx_files:
+        content = received_gpx_file.read()
+        total_size += len(content)
+
+        if total_size > BATCH_MAX_SIZE_MB * BYTES_PER_MB:
+            raise RequestError(ErrorMessage.BATCH_TOO_LARGE)
+
+        yield received_gpx_file.filename, content
+
+def read_archive_files(received_gpx_archive):
+    try:
+        archive = zipfile.ZipFile(received_gpx_archive.stream)
+    except zipfile.BadZipFile:
+        raise RequestError(ErrorMessage.INVALID_ARCHIVE)
+
+    with archive:
+        infos = [info for info in archive.infolist() if not info.is_dir() and not info.filename.startswith(ARCHIVE_METADATA_DIRECTORY)]
+
+        # the sizes are checked before anything is extracted
+        if len(infos) > BATCH_MAX_FILES or sum(info.file_size for info in infos) > BATCH_MAX_SIZE_MB * BYTES_PER_MB:
+            raise RequestError(ErrorMessage.BATCH_TOO_LARGE)
+
+        try:
+            return [(info.filename, archive.read(info)) for info in infos]
+        except (zipfile.BadZipFile, NotImplementedError, RuntimeError):
+            raise RequestError(ErrorMessage.INVALID_ARCHIVE)
+
+def read_batch_route(file_name, content):
+    route = BatchRoute(file_name)
+
+    try:
+        route.tree = ET.ElementTree(ET.fromstring(content))
+    except ET.ParseError:
+        route.error = ErrorMessage.INVALID_GPX
+
+        return route
+
+    root = route.tree.getroot()
+
+    try:
+        route.track_points = extract_track_points(root)
+        route.has_elevations = bool(extract_elevation(root))
+    except (ValueError, KeyError, TypeError):
+        # a track point without numeric coordinates or an empty elevation
+        route.error = ErrorMessage.INVALID_GPX
+
+        return route
+
+    if not route.track_points:
+        route.error = ErrorMessage.TRACK_POINTS_NOT_FOUND
+
+    return route
+
+def add_approximated_elevations(routes):
+    lngs = np.concatenate([route.track_points.lngs for route in routes])
+    lats = np.concatenate([route.track_points.lats for route in routes])
+    unique_coordinates, inverse = np.unique(np.column_stack((lngs, lats)), axis=0, return_inverse=True)
+
+    logging.debug("Sample %d distinct of %d track points", len(unique_coordinates), len(lngs))
+
+    unique_elevations = get_approximated_elevations(TrackPoints(unique_coordinates[:, 0], unique_coordinates[:, 1]))
+    elevations = unique_elevations[inverse.ravel()]
+    route_ends = np.cumsum([len(route.track_points) for route in routes])
+
+    for route, route_elevations in zip(routes, np.split(elevations, route_ends[:-1])):
+        track_points = route.track_points.with_elevations(route_elevations)
+
+        if not route.has_elevations:
+            add_elevation_element(route.tree.getroot(), track_points)
+        else:
+            replace_existing_elevations(route.tree.getroot(), track_points)
+
+def write_batch_archive(routes):
+    batch_archive = tempfile.TemporaryFile()
+    entry_names = set()
+
+    with zipfile.ZipFile(batch_archive, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for route in routes:
+            if route.error is not None:
+                continue
+
+            route.entry_name = get_unique_entry_name(route.file_name, entry_names)
+
+            with archive.open(route.entry_name, 'w') as entry:
+                route.tree.write(entry)
+
+        manifest = {'files': [route.to_manifest_entry() for route in routes]}
+        archive.writestr(BATCH_MANIFEST_NAME, json.dumps(manifest))
+
+    batch_archive.seek(0)
+
+    return batch_archive
+
+def get_unique_entry_name(file_name, entry_names):
+    base_name, extension = os.path.splitext(os.path.basename(file_name or '') or 'route.gpx')
+    entry_name = base_name + extension
+    idx = 1
+
+    while entry_name in entry_names or entry_name == BATCH_MANIFEST_NAME:
+        idx += 1
+        entry_name = '%s (%d)%s' % (base_name, idx, extension)
+
+    entry_names.add(entry_name)
+
+    return entry_name